@@ -0,0 +1,36 @@
+"""drop redundant tenant_id indexes on assignment and report_review
+
+Revision ID: 3f9d2c7a1b44
+Revises: v1_0_0
+Create Date: 2026-10-17
+
+ix_assignment_tenant_id and ix_report_review_tenant_id are prefixes of the
+composite (tenant_id, ...) indexes on the same tables, which serve every
+tenant-scoped lookup on their own. ix_assignment_item is kept: several
+lookups filter on (item_type, item_id) without tenant_id.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9d2c7a1b44"
+down_revision: Union[str, Sequence[str], None] = "v1_0_0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS public.ix_assignment_tenant_id")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS public.ix_report_review_tenant_id")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_assignment_tenant_id ON public.assignment USING btree (tenant_id)")
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_report_review_tenant_id ON public.report_review USING btree (tenant_id)")
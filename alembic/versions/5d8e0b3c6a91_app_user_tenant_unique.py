@@ -0,0 +1,54 @@
+"""enforce per-tenant unique email and username on app_user
+
+Revision ID: 5d8e0b3c6a91
+Revises: c42a7e9d5f13
+Create Date: 2026-10-17
+
+Email and username have always been unique per tenant by convention, checked
+by SELECTs in the registration and profile endpoints. Back that with unique
+constraints on (tenant_id, email) and (tenant_id, username), so those
+lookups are index probes and concurrent writers cannot slip duplicates in.
+
+Each index is built CONCURRENTLY and then attached as a constraint, which
+only needs a brief lock. If a tenant already holds duplicates the build
+fails; resolve them, drop the INVALID index and re-run.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5d8e0b3c6a91"
+down_revision: Union[str, Sequence[str], None] = "c42a7e9d5f13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_app_user_tenant_email "
+            "ON public.app_user USING btree (tenant_id, email)"
+        )
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_app_user_tenant_username "
+            "ON public.app_user USING btree (tenant_id, username)"
+        )
+
+    op.execute("""
+        ALTER TABLE public.app_user
+            ADD CONSTRAINT uq_app_user_tenant_email UNIQUE USING INDEX uq_app_user_tenant_email,
+            ADD CONSTRAINT uq_app_user_tenant_username UNIQUE USING INDEX uq_app_user_tenant_username
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("""
+        ALTER TABLE public.app_user
+            DROP CONSTRAINT uq_app_user_tenant_email,
+            DROP CONSTRAINT uq_app_user_tenant_username
+    """)
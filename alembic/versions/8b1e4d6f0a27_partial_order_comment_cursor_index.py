@@ -0,0 +1,45 @@
+"""restrict order_comment cursor index to live comments
+
+Revision ID: 8b1e4d6f0a27
+Revises: 3f9d2c7a1b44
+Create Date: 2026-10-17
+
+Every comment listing filters on deleted_at IS NULL, so soft-deleted rows in
+idx_order_comment_order_cursor are dead weight. The partial replacement is
+built under a temporary name before the old index is dropped, so the cursor
+query is never left without an index.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8b1e4d6f0a27"
+down_revision: Union[str, Sequence[str], None] = "3f9d2c7a1b44"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_order_comment_order_cursor_live "
+            "ON public.order_comment USING btree (tenant_id, order_id, created_at DESC, id DESC) "
+            "WHERE (deleted_at IS NULL)"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS public.idx_order_comment_order_cursor")
+        op.execute("ALTER INDEX public.idx_order_comment_order_cursor_live RENAME TO idx_order_comment_order_cursor")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_order_comment_order_cursor_all "
+            "ON public.order_comment USING btree (tenant_id, order_id, created_at DESC, id DESC)"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS public.idx_order_comment_order_cursor")
+        op.execute("ALTER INDEX public.idx_order_comment_order_cursor_all RENAME TO idx_order_comment_order_cursor")
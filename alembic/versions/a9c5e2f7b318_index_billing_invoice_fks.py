@@ -0,0 +1,41 @@
+"""index payment and invoice_item by invoice
+
+Revision ID: a9c5e2f7b318
+Revises: e7a3f1c9d205
+Create Date: 2026-10-17
+
+Balances, lock updates and invoice totals all aggregate payment and
+invoice_item rows per invoice, but neither invoice_id foreign key was
+indexed, so each of those sums scanned the whole table.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a9c5e2f7b318"
+down_revision: Union[str, Sequence[str], None] = "e7a3f1c9d205"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_payment_invoice_id "
+            "ON public.payment USING btree (invoice_id)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_invoice_item_invoice_id "
+            "ON public.invoice_item USING btree (invoice_id)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS public.ix_invoice_item_invoice_id")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS public.ix_payment_invoice_id")
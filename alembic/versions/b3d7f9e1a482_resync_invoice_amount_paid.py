@@ -0,0 +1,63 @@
+"""resync invoice.amount_paid with recorded payments
+
+Revision ID: b3d7f9e1a482
+Revises: f1b8d4a6c027
+Create Date: 2026-10-17
+
+Balances are now read from invoice.amount_paid instead of summing payment
+rows on every request, and create_payment increments it in place. Bring
+every invoice's cached value in line with its payments once so the
+incremental updates start from the true sum. Invoices are walked by id in
+batches of 5000, each committed on its own.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b3d7f9e1a482"
+down_revision: Union[str, Sequence[str], None] = "f1b8d4a6c027"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_PAID = "(SELECT COALESCE(SUM(amount), 0) FROM public.payment WHERE invoice_id = i.id)"
+
+# Resyncs the next 5000 invoices by id and returns the last id seen (no row
+# once past the end); only rows whose cache is off are rewritten
+_RESYNC_BATCH = f"""
+    WITH batch AS (
+        SELECT id FROM public.invoice
+        WHERE id > CAST(:after AS uuid)
+        ORDER BY id
+        LIMIT 5000
+    ), resync AS (
+        UPDATE public.invoice AS i
+        SET amount_paid = {_PAID}
+        FROM batch
+        WHERE i.id = batch.id
+          AND i.amount_paid IS DISTINCT FROM {_PAID}
+    )
+    SELECT id FROM batch ORDER BY id DESC LIMIT 1
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        if context.is_offline_mode():
+            op.execute(f"UPDATE public.invoice AS i SET amount_paid = {_PAID} WHERE i.amount_paid IS DISTINCT FROM {_PAID}")
+        else:
+            conn = op.get_bind()
+            # uuid4 ids never equal the nil UUID, so starting after it covers every row
+            after = "00000000-0000-0000-0000-000000000000"
+            while after is not None:
+                after = conn.execute(sa.text(_RESYNC_BATCH), {"after": str(after)}).scalar()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Data-only resync; the previous (stale) values are not restored
+    pass
@@ -0,0 +1,79 @@
+"""look up blacklisted tokens by sha256 digest
+
+Revision ID: c42a7e9d5f13
+Revises: 8b1e4d6f0a27
+Create Date: 2026-10-17
+
+Adds blacklisted_token.token_hash (hex sha256 of the JWT) with a unique
+index and drops the unique btree on the raw varchar(1000) token, so each
+index entry is 64 bytes instead of a full JWT.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c42a7e9d5f13"
+down_revision: Union[str, Sequence[str], None] = "8b1e4d6f0a27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_TOKEN_DIGEST = "encode(sha256(convert_to(token, 'UTF8')), 'hex')"
+
+_BACKFILL_BATCH = f"""
+    UPDATE public.blacklisted_token
+    SET token_hash = {_TOKEN_DIGEST}
+    WHERE id IN (
+        SELECT id FROM public.blacklisted_token
+        WHERE token_hash IS NULL
+        LIMIT 5000
+        FOR UPDATE SKIP LOCKED
+    )
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE public.blacklisted_token ADD COLUMN token_hash character varying(64)")
+
+    with op.get_context().autocommit_block():
+        if context.is_offline_mode():
+            op.execute(f"UPDATE public.blacklisted_token SET token_hash = {_TOKEN_DIGEST} WHERE token_hash IS NULL")
+        else:
+            conn = op.get_bind()
+            while conn.execute(sa.text(_BACKFILL_BATCH)).rowcount:
+                pass
+
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_blacklisted_token_token_hash "
+            "ON public.blacklisted_token USING btree (token_hash)"
+        )
+
+        # NOT NULL via a validated check so SET NOT NULL skips its table scan
+        op.execute(
+            "ALTER TABLE public.blacklisted_token ADD CONSTRAINT blacklisted_token_token_hash_not_null "
+            "CHECK (token_hash IS NOT NULL) NOT VALID"
+        )
+        op.execute("ALTER TABLE public.blacklisted_token VALIDATE CONSTRAINT blacklisted_token_token_hash_not_null")
+        op.execute("""
+            ALTER TABLE public.blacklisted_token
+                ALTER COLUMN token_hash SET NOT NULL,
+                DROP CONSTRAINT blacklisted_token_token_hash_not_null
+        """)
+
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS public.ix_blacklisted_token_token")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_blacklisted_token_token "
+            "ON public.blacklisted_token USING btree (token)"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS public.ix_blacklisted_token_token_hash")
+
+    op.execute("ALTER TABLE public.blacklisted_token DROP COLUMN token_hash")
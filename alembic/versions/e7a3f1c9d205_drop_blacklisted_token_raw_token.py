@@ -0,0 +1,32 @@
+"""stop storing raw JWTs in blacklisted_token
+
+Revision ID: e7a3f1c9d205
+Revises: 5d8e0b3c6a91
+Create Date: 2026-10-17
+
+Revocation is looked up by token_hash only, so the raw token column is
+just a copy of a bearer credential sitting in the database. Drop it.
+The downgrade restores the column as nullable; the dropped values cannot
+be recovered.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e7a3f1c9d205"
+down_revision: Union[str, Sequence[str], None] = "5d8e0b3c6a91"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE public.blacklisted_token DROP COLUMN IF EXISTS token")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE public.blacklisted_token ADD COLUMN IF NOT EXISTS token character varying(1000)")
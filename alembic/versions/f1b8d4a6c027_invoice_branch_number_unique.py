@@ -0,0 +1,44 @@
+"""enforce unique invoice numbers per branch
+
+Revision ID: f1b8d4a6c027
+Revises: a9c5e2f7b318
+Create Date: 2026-10-17
+
+Invoice numbers have been unique per branch by a SELECT in create_invoice.
+Back that with a (branch_id, invoice_number) unique constraint so the
+check is race-free and the endpoint can drop its preflight query.
+
+The index is built CONCURRENTLY and then attached as a constraint. If a
+branch already holds duplicate numbers the build fails; resolve them,
+drop the INVALID index and re-run.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f1b8d4a6c027"
+down_revision: Union[str, Sequence[str], None] = "a9c5e2f7b318"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_invoice_branch_number "
+            "ON public.invoice USING btree (branch_id, invoice_number)"
+        )
+
+    op.execute(
+        "ALTER TABLE public.invoice "
+        "ADD CONSTRAINT uq_invoice_branch_number UNIQUE USING INDEX uq_invoice_branch_number"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE public.invoice DROP CONSTRAINT uq_invoice_branch_number")
@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import HTTPBearer
-from jose import jwt, JWTError
 from sqlmodel import select, Session
+from sqlalchemy import lambda_stmt
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import defer
 import logging
-from app.core.db import get_session
+from app.core.db import get_session, constraint_name
 from app.models.user import AppUser, BlacklistedToken, UserBranch
 from app.models.tenant import Tenant, Branch
 from app.models.invitation import PasswordResetToken
-from app.core.security import hash_password, verify_password, create_jwt, decode_jwt
+from app.core.security import hash_password, verify_password, dummy_verify_password, create_jwt, decode_jwt, hash_token
+from app.core.token_blacklist import is_token_revoked, mark_token_revoked
 from app.core.config import settings
 from app.core.rbac import (
     get_user_permissions,
@@ -17,6 +21,7 @@ from app.core.rbac import (
 )
 from app.services.email import EmailService
 from datetime import timedelta
+from uuid import UUID
 import secrets
 from app.schemas.auth import (
     UserRegister,
@@ -32,7 +37,7 @@ from app.schemas.auth import (
     RegistrationResponse,
 )
 from datetime import datetime
-from typing import Union
+from typing import Optional, Tuple, Union
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
@@ -40,6 +45,17 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/auth")
 scheme = HTTPBearer()
 
+# app_user unique constraints -> (conflicting field, client-facing message)
+_USER_UNIQUE_CONSTRAINTS = {
+    "uq_app_user_tenant_email": ("email", "Email already registered for this tenant"),
+    "uq_app_user_tenant_username": ("username", "Username already registered for this tenant"),
+}
+
+
+def user_conflict(exc: IntegrityError) -> Optional[Tuple[str, str]]:
+    """Return (field, message) if exc violated a per-tenant app_user uniqueness constraint."""
+    return _USER_UNIQUE_CONSTRAINTS.get(constraint_name(exc, AppUser.__table__))
+
 
 def split_full_name(full_name: str) -> tuple[str, str]:
     """Split full_name into first_name and last_name.
@@ -66,17 +82,6 @@ def register(user_data: UserRegister, session: Session = Depends(get_session)):
             "tenant_id": str(user_data.tenant_id),
         },
     )
-    # Check if email already exists for this tenant
-    if session.exec(select(AppUser).where(AppUser.email == user_data.email, AppUser.tenant_id == user_data.tenant_id)).first():
-        logger.warning("Email already registered for tenant", extra={"event": "auth.register.conflict_email", "email": user_data.email, "tenant_id": str(user_data.tenant_id)})
-        raise HTTPException(400, "Email already registered for this tenant")
-    
-    # Check if username already exists for this tenant (if provided)
-    if user_data.username:
-        if session.exec(select(AppUser).where(AppUser.username == user_data.username, AppUser.tenant_id == user_data.tenant_id)).first():
-            logger.warning("Username already registered for tenant", extra={"event": "auth.register.conflict_username", "username": user_data.username, "tenant_id": str(user_data.tenant_id)})
-            raise HTTPException(400, "Username already registered for this tenant")
-    
     first_name, last_name = split_full_name(user_data.full_name)
     u = AppUser(
         email=user_data.email,
@@ -88,16 +93,25 @@ def register(user_data: UserRegister, session: Session = Depends(get_session)):
         hashed_password=hash_password(user_data.password),
     )
     session.add(u)
-    session.flush()
+    # Email/username uniqueness per tenant is enforced by the unique constraints
+    try:
+        session.flush()
+    except IntegrityError as e:
+        session.rollback()
+        conflict = user_conflict(e)
+        if conflict is None:
+            raise
+        field, message = conflict
+        logger.warning(f"{field.capitalize()} already registered for tenant", extra={"event": f"auth.register.conflict_{field}", field: getattr(user_data, field), "tenant_id": str(user_data.tenant_id)})
+        raise HTTPException(400, message)
     # Assign the requested role (validated against catalog)
     try:
         assign_role_by_code(u.id, user_data.role, session)
     except ValueError:
         raise HTTPException(400, f"Unknown role: {user_data.role}")
-    session.commit()
-    session.refresh(u)
-    logger.info("User registered successfully", extra={"event": "auth.register.success", "user_id": str(u.id), "email": u.email, "tenant_id": str(u.tenant_id)})
-    return UserResponse(
+    # Build the response before committing: every column is set client-side,
+    # and reading them after commit would expire and reload the row
+    response = UserResponse.model_construct(
         id=str(u.id),
         email=u.email,
         username=u.username,
@@ -105,34 +119,45 @@ def register(user_data: UserRegister, session: Session = Depends(get_session)):
         roles=get_user_roles(u.id, session),
         branch_ids=[],
     )
+    session.commit()
+    logger.info("User registered successfully", extra={"event": "auth.register.success", "user_id": response.id, "email": response.email, "tenant_id": str(user_data.tenant_id)})
+    return response
 
 def current_user(request: Request, token=Depends(scheme), session: Session = Depends(get_session)):
     request_id = getattr(request.state, "request_id", "unknown")[:8]
-    logger.info(f"🔐 [{request_id}] Authenticating token: {token.credentials[:20]}...")
+    logger.info("🔐 [%s] Authenticating token: %s...", request_id, token.credentials[:20])
     
+    # Verified payloads are cached per token until exp (see decode_jwt)
+    payload = decode_jwt(token.credentials)
+    if payload is None:
+        logger.error("❌ [%s] JWT decode error: invalid signature or expired token", request_id)
+        raise HTTPException(401, "Invalid token")
     try:
-        # Check if token is blacklisted
-        blacklisted = session.exec(select(BlacklistedToken).where(BlacklistedToken.token == token.credentials)).first()
-        if blacklisted:
-            logger.warning(f"🚫 [{request_id}] Token is blacklisted: {token.credentials[:20]}...")
-            raise HTTPException(401, "Token has been revoked")
-        
-        payload = jwt.decode(token.credentials, settings.jwt_secret, algorithms=["HS256"])
-        uid = payload["sub"]
-        logger.info(f"✅ [{request_id}] Token decoded successfully, user ID: {uid}")
-    except JWTError as e:
-        logger.error(f"❌ [{request_id}] JWT decode error: {str(e)}")
+        uid = UUID(payload["sub"])
+        exp = payload["exp"]
+        logger.info("✅ [%s] Token decoded successfully, user ID: %s", request_id, uid)
+    except (KeyError, ValueError, TypeError) as e:
+        logger.error("❌ [%s] JWT decode error: %s", request_id, e)
         raise HTTPException(401, "Invalid token")
+
+    # Check if token is blacklisted (cached in-process, see app.core.token_blacklist)
+    if is_token_revoked(session, token.credentials, exp):
+        logger.warning("🚫 [%s] Token is blacklisted: %s...", request_id, token.credentials[:20])
+        raise HTTPException(401, "Token has been revoked")
     
-    u = session.get(AppUser, uid)
+    # hashed_password is only needed by the password-change path, which
+    # lazy-loads it from the same session on access
+    u = session.exec(
+        lambda_stmt(lambda: select(AppUser).options(defer(AppUser.hashed_password)).where(AppUser.id == uid))
+    ).scalars().first()
     if not u:
-        logger.error(f"❌ [{request_id}] User not found: {uid}")
+        logger.error("❌ [%s] User not found: %s", request_id, uid)
         raise HTTPException(401, "User not found")
     if not u.is_active:
-        logger.error(f"❌ [{request_id}] User inactive: {uid}")
+        logger.error("❌ [%s] User inactive: %s", request_id, uid)
         raise HTTPException(401, "Inactive user")
         
-    logger.info(f"🎉 [{request_id}] Authentication successful for user: {u.email}")
+    logger.info("🎉 [%s] Authentication successful for user: %s", request_id, u.email)
     return u
 
 
@@ -167,38 +192,46 @@ def login(credentials: UserLogin, session: Session = Depends(get_session)):
             "tenant_id": str(credentials.tenant_id) if credentials.tenant_id else None,
         },
     )
+    # Lookups go through lambda_stmt so repeated logins reuse the built
+    # statement; the lambdas may only close over plain values
+    login_name = credentials.username_or_email
+
     # If tenant_id is provided, behave as before (tenant-scoped login)
     if credentials.tenant_id:
+        tenant_id = credentials.tenant_id
         user = session.exec(
-            select(AppUser).where(
-                (AppUser.username == credentials.username_or_email) | (AppUser.email == credentials.username_or_email),
-                AppUser.tenant_id == credentials.tenant_id,
-            )
-        ).first()
-
-        if not user or not verify_password(credentials.password, user.hashed_password):
+            lambda_stmt(lambda: select(AppUser).where(
+                (AppUser.username == login_name) | (AppUser.email == login_name),
+                AppUser.tenant_id == tenant_id,
+            ))
+        ).scalars().first()
+
+        # Unknown users still pay for one hash so timing doesn't reveal which accounts exist
+        if user:
+            password_ok = verify_password(credentials.password, user.hashed_password)
+        else:
+            password_ok = dummy_verify_password(credentials.password)
+        if not password_ok:
             logger.warning("Invalid credentials (tenant-scoped)", extra={"event": "auth.login.invalid_credentials", "username_or_email": credentials.username_or_email, "tenant_id": str(credentials.tenant_id)})
             raise HTTPException(401, "Invalid credentials")
         if not user.is_active:
             logger.warning("Inactive user login attempt", extra={"event": "auth.login.inactive", "user_id": str(user.id), "tenant_id": str(user.tenant_id)})
             raise HTTPException(401, "User account is inactive")
         logger.info("Login success", extra={"event": "auth.login.success", "user_id": str(user.id), "tenant_id": str(user.tenant_id)})
-        return LoginResponse(access_token=create_jwt(sub=str(user.id)), token_type="Bearer", tenant_id=str(user.tenant_id))
+        return LoginResponse.model_construct(access_token=create_jwt(sub=str(user.id)), token_type="Bearer", tenant_id=str(user.tenant_id))
 
     # No tenant_id provided: find matches across all tenants
-    candidates = []
-    by_username = session.exec(select(AppUser).where(AppUser.username == credentials.username_or_email)).all()
-    by_email = session.exec(select(AppUser).where(AppUser.email == credentials.username_or_email)).all()
-
-    # Deduplicate by user id
-    seen = set()
-    for u in by_username + by_email:
-        if u.id not in seen:
-            seen.add(u.id)
-            candidates.append(u)
-
-    # Filter by active and password match
-    valid_users = [u for u in candidates if u.is_active and verify_password(credentials.password, u.hashed_password)]
+    # Inactive accounts are filtered in SQL so they never cost a password hash
+    candidates = session.exec(
+        lambda_stmt(lambda: select(AppUser).where(
+            (AppUser.username == login_name) | (AppUser.email == login_name),
+            AppUser.is_active == True,
+        ))
+    ).scalars().all()
+
+    if not candidates:
+        dummy_verify_password(credentials.password)
+    valid_users = [u for u in candidates if verify_password(credentials.password, u.hashed_password)]
 
     if not valid_users:
         logger.warning("Invalid credentials (multi-tenant)", extra={"event": "auth.login.invalid_credentials", "username_or_email": credentials.username_or_email})
@@ -207,16 +240,19 @@ def login(credentials: UserLogin, session: Session = Depends(get_session)):
     if len(valid_users) == 1:
         user = valid_users[0]
         logger.info("Login success (single match)", extra={"event": "auth.login.success", "user_id": str(user.id), "tenant_id": str(user.tenant_id)})
-        return LoginResponse(access_token=create_jwt(sub=str(user.id)), token_type="Bearer", tenant_id=str(user.tenant_id))
+        return LoginResponse.model_construct(access_token=create_jwt(sub=str(user.id)), token_type="Bearer", tenant_id=str(user.tenant_id))
 
     # Multiple tenants: return selection list
-    options = []
-    for u in valid_users:
-        tenant = session.get(Tenant, u.tenant_id)
-        options.append(TenantOption(tenant_id=str(u.tenant_id), tenant_name=tenant.name if tenant else "Unknown"))
+    tenant_names = dict(session.exec(
+        select(Tenant.id, Tenant.name).where(Tenant.id.in_({u.tenant_id for u in valid_users}))
+    ).all())
+    options = [
+        TenantOption.model_construct(tenant_id=str(u.tenant_id), tenant_name=tenant_names.get(u.tenant_id, "Unknown"))
+        for u in valid_users
+    ]
 
     logger.info("Login requires tenant selection", extra={"event": "auth.login.need_tenant_selection", "options_count": len(options)})
-    return LoginTenantSelectionResponse(need_tenant_selection=True, options=options)
+    return LoginTenantSelectionResponse.model_construct(need_tenant_selection=True, options=options)
 
 @router.post("/logout", response_model=LogoutResponse)
 def logout(token: str = Depends(scheme), session: Session = Depends(get_session)):
@@ -236,22 +272,27 @@ def logout(token: str = Depends(scheme), session: Session = Depends(get_session)
             logger.warning("Invalid token payload on logout", extra={"event": "auth.logout.invalid_payload"})
             raise HTTPException(401, "Invalid token payload")
         
-        # Check if token is already blacklisted
-        existing_blacklist = session.exec(select(BlacklistedToken).where(BlacklistedToken.token == token.credentials)).first()
-        if existing_blacklist:
-            logger.info("Token already revoked", extra={"event": "auth.logout.already_revoked", "user_id": str(user_id)})
-            return LogoutResponse(message="Token already revoked", token_revoked=False)
-        
-        # Create blacklisted token record
+        # Blacklist the token by digest only, never the raw JWT; the unique
+        # token_hash index turns a repeat (or concurrent) logout into a no-op
         expires_at = datetime.fromtimestamp(exp_timestamp)
         blacklisted_token = BlacklistedToken(
-            token=token.credentials,
-            user_id=user_id,
+            token_hash=hash_token(token.credentials),
+            user_id=UUID(user_id),
             expires_at=expires_at
         )
-        
-        session.add(blacklisted_token)
+        inserted = session.exec(
+            pg_insert(BlacklistedToken)
+            .values(**blacklisted_token.model_dump())
+            .on_conflict_do_nothing(index_elements=["token_hash"])
+            .returning(BlacklistedToken.id)
+        ).first()
         session.commit()
+        mark_token_revoked(token.credentials, exp_timestamp)
+
+        if inserted is None:
+            logger.info("Token already revoked", extra={"event": "auth.logout.already_revoked", "user_id": str(user_id)})
+            return LogoutResponse(message="Token already revoked", token_revoked=False)
+
         logger.info("Logout successful", extra={"event": "auth.logout.success", "user_id": str(user_id)})
         
         return LogoutResponse(message="Logout successful", token_revoked=True)
@@ -265,7 +306,7 @@ def logout(token: str = Depends(scheme), session: Session = Depends(get_session)
 def me(request: Request, user: AppUser = Depends(current_user), session: Session = Depends(get_session)):
     """Get current user profile with effective roles and permissions."""
     request_id = getattr(request.state, "request_id", "unknown")[:8]
-    logger.info(f"🔍 [{request_id}] GET /auth/me called for user ID: {user.id}")
+    logger.info("🔍 [%s] GET /auth/me called for user ID: %s", request_id, user.id)
 
     roles = get_user_roles(user.id, session)
     permissions = sorted(get_user_permissions(user.id, session))
@@ -276,8 +317,8 @@ def me(request: Request, user: AppUser = Depends(current_user), session: Session
     else:
         branch_ids = [str(ub.branch_id) for ub in user.branches]
 
-    logger.info(f"👤 [{request_id}] User details: email={user.email}, roles={roles}")
-    profile = UserProfile(
+    logger.info("👤 [%s] User details: email=%s, roles=%s", request_id, user.email, roles)
+    profile = UserProfile.model_construct(
         id=str(user.id),
         email=user.email,
         username=user.username,
@@ -288,7 +329,7 @@ def me(request: Request, user: AppUser = Depends(current_user), session: Session
         branch_ids=branch_ids,
         avatar_url=user.avatar_url,
     )
-    logger.info(f"📤 [{request_id}] Returning profile for {user.email}")
+    logger.info("📤 [%s] Returning profile for %s", request_id, user.email)
     return profile
 
 @router.put("/me", response_model=UserProfile)
@@ -300,39 +341,33 @@ def update_me(
 ):
     """Update current user profile and/or password"""
     request_id = getattr(request.state, "request_id", "unknown")[:8]
-    logger.info(f"🔄 [{request_id}] PUT /auth/me called for user ID: {user.id}")
-    logger.info(f"📝 [{request_id}] Update data received: {data.dict(exclude_none=True)}")
-    logger.info(f"👤 [{request_id}] Current user: email={user.email}, username={user.username}")
-    # Validate and update username
+    logger.info("🔄 [%s] PUT /auth/me called for user ID: %s", request_id, user.id)
+    # Field names only: the payload may carry the current and new password
+    logger.info("📝 [%s] Update fields received: %s", request_id, sorted(data.model_fields_set))
+    logger.info("👤 [%s] Current user: email=%s, username=%s", request_id, user.email, user.username)
+    # Username and email clashes within the tenant surface as IntegrityError on flush
     if data.username is not None and data.username != user.username:
-        existing_username = session.exec(
-            select(AppUser).where(
-                AppUser.username == data.username,
-                AppUser.tenant_id == user.tenant_id,
-                AppUser.id != user.id,
-            )
-        ).first()
-        if existing_username:
-            raise HTTPException(400, "Username already registered for this tenant")
         user.username = data.username
 
-    # Validate and update email
     if data.email is not None and data.email != user.email:
-        existing_email = session.exec(
-            select(AppUser).where(
-                AppUser.email == data.email,
-                AppUser.tenant_id == user.tenant_id,
-                AppUser.id != user.id,
-            )
-        ).first()
-        if existing_email:
-            raise HTTPException(400, "Email already registered for this tenant")
         user.email = data.email
 
     # Update full name
     if data.full_name is not None:
         user.full_name = data.full_name
 
+    # Flushed before the password check so a conflict is reported first, and
+    # so loading the deferred hash below has nothing left to autoflush
+    session.add(user)
+    try:
+        session.flush()
+    except IntegrityError as e:
+        session.rollback()
+        conflict = user_conflict(e)
+        if conflict is None:
+            raise
+        raise HTTPException(400, conflict[1])
+
     # Change password if requested
     if data.new_password:
         if not data.current_password:
@@ -341,10 +376,6 @@ def update_me(
             raise HTTPException(400, "Current password is incorrect")
         user.hashed_password = hash_password(data.new_password)
 
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-
     roles = get_user_roles(user.id, session)
     permissions = sorted(get_user_permissions(user.id, session))
 
@@ -354,7 +385,7 @@ def update_me(
     else:
         branch_ids = [str(ub.branch_id) for ub in user.branches]
 
-    updated_profile = UserProfile(
+    updated_profile = UserProfile.model_construct(
         id=str(user.id),
         email=user.email,
         username=user.username,
@@ -365,7 +396,10 @@ def update_me(
         branch_ids=branch_ids,
         avatar_url=user.avatar_url,
     )
-    logger.info(f"✅ [{request_id}] Profile updated successfully for {user.email}")
+    # Commit only once the profile is built: committing expires the user and
+    # the reads above would each reload it
+    session.commit()
+    logger.info("✅ [%s] Profile updated successfully for %s", request_id, updated_profile.email)
     return updated_profile
 
 
@@ -382,6 +416,10 @@ def unified_registration(payload: RegistrationRequest, session: Session = Depend
                 "admin_email": payload.admin_user.email,
             },
         )
+        # Hash before opening the transaction so the connection isn't held
+        # for the duration of the key derivation
+        hashed_password = hash_password(payload.admin_user.password)
+
         # Start explicit transaction for atomicity
         with session.begin():
             # 1) Create tenant
@@ -390,18 +428,14 @@ def unified_registration(payload: RegistrationRequest, session: Session = Depend
                 legal_name=payload.tenant.legal_name,
                 tax_id=payload.tenant.tax_id,
             )
+            # Primary keys are uuid4 defaults assigned on construction, so the
+            # ids below are usable without flushing; all rows go out together
+            # on the first query that autoflushes (or at commit)
             session.add(tenant)
-            session.flush()  # ensure tenant.id is available
             logger.info("Tenant created", extra={"event": "auth.register_unified.tenant_created", "tenant_id": str(tenant.id)})
 
-            # 2) Create branch (ensure code uniqueness within tenant)
-            existing_branch = session.exec(
-                select(Branch).where(Branch.tenant_id == tenant.id, Branch.code == payload.branch.code)
-            ).first()
-            if existing_branch:
-                logger.warning("Branch code already exists for tenant", extra={"event": "auth.register_unified.conflict_branch", "tenant_id": str(tenant.id), "branch_code": payload.branch.code})
-                raise HTTPException(400, "Branch code already exists for this tenant")
-
+            # 2) Create branch. The tenant was created just above, so its
+            # branch codes and user emails/usernames cannot collide yet.
             branch = Branch(
                 tenant_id=tenant.id,
                 code=payload.branch.code,
@@ -415,28 +449,9 @@ def unified_registration(payload: RegistrationRequest, session: Session = Depend
                 country=payload.branch.country,
             )
             session.add(branch)
-            session.flush()
             logger.info("Branch created", extra={"event": "auth.register_unified.branch_created", "branch_id": str(branch.id), "tenant_id": str(tenant.id)})
 
-            # 3) Create admin user (ensure email/username uniqueness within tenant)
-            existing_email = session.exec(
-                select(AppUser).where(AppUser.email == payload.admin_user.email, AppUser.tenant_id == tenant.id)
-            ).first()
-            if existing_email:
-                logger.warning("Admin email already registered for tenant", extra={"event": "auth.register_unified.conflict_email", "email": payload.admin_user.email, "tenant_id": str(tenant.id)})
-                raise HTTPException(400, "Email already registered for this tenant")
-
-            if payload.admin_user.username:
-                existing_username = session.exec(
-                    select(AppUser).where(
-                        AppUser.username == payload.admin_user.username,
-                        AppUser.tenant_id == tenant.id,
-                    )
-                ).first()
-                if existing_username:
-                    logger.warning("Admin username already registered for tenant", extra={"event": "auth.register_unified.conflict_username", "username": payload.admin_user.username, "tenant_id": str(tenant.id)})
-                    raise HTTPException(400, "Username already registered for this tenant")
-
+            # 3) Create admin user
             first_name, last_name = split_full_name(payload.admin_user.full_name)
             user = AppUser(
                 tenant_id=tenant.id,
@@ -445,10 +460,9 @@ def unified_registration(payload: RegistrationRequest, session: Session = Depend
                 full_name=payload.admin_user.full_name,
                 first_name=first_name,
                 last_name=last_name,
-                hashed_password=hash_password(payload.admin_user.password),
+                hashed_password=hashed_password,
             )
             session.add(user)
-            session.flush()
             # Assign the admin role (and superuser role) via RBAC
             assign_role_by_code(user.id, "admin", session)
             assign_role_by_code(user.id, "superuser", session)
@@ -458,13 +472,16 @@ def unified_registration(payload: RegistrationRequest, session: Session = Depend
             session.add(UserBranch(user_id=user.id, branch_id=branch.id))
             logger.info("User associated to branch", extra={"event": "auth.register_unified.user_branch_associated", "user_id": str(user.id), "branch_id": str(branch.id)})
 
+            # Read ids while the rows are loaded; commit expires them
+            response = RegistrationResponse(
+                tenant_id=str(tenant.id),
+                branch_id=str(branch.id),
+                user_id=str(user.id),
+            )
+
         # After context, transaction committed
-        logger.info("Unified registration success", extra={"event": "auth.register_unified.success", "tenant_id": str(tenant.id), "branch_id": str(branch.id), "user_id": str(user.id)})
-        return RegistrationResponse(
-            tenant_id=str(tenant.id),
-            branch_id=str(branch.id),
-            user_id=str(user.id),
-        )
+        logger.info("Unified registration success", extra={"event": "auth.register_unified.success", "tenant_id": response.tenant_id, "branch_id": response.branch_id, "user_id": response.user_id})
+        return response
     except HTTPException:
         # Propagate known errors
         logger.warning("Unified registration failed with HTTP error", extra={"event": "auth.register_unified.error_http"})
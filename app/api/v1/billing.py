@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import select, Session, func
-from typing import List
+from sqlalchemy import lambda_stmt
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload
+from typing import List, Optional
+from uuid import UUID
 from datetime import datetime
-from app.core.db import get_session
+from app.core.db import get_session, constraint_name
 from app.api.v1.auth import get_auth_ctx, AuthContext, current_user
 from app.models.billing import Invoice, Payment, InvoiceItem
 from app.models.laboratory import Order
@@ -151,38 +155,35 @@ def create_invoice_for_order(session: Session, order: Order) -> Invoice:
     return invoice
 
 
-def calculate_invoice_balance(session: Session, invoice_id: str) -> float:
-    """Calculate remaining balance for an invoice"""
-    invoice = session.get(Invoice, invoice_id)
-    if not invoice:
-        return 0.0
-    
-    # Sum all payments for this invoice (using new 'amount' field)
-    total_paid = session.exec(
-        select(func.sum(Payment.amount))
-        .where(Payment.invoice_id == invoice_id)
-    ).first() or 0.0
-    
-    balance = float(invoice.total) - float(total_paid)
+def calculate_invoice_balance(invoice: Invoice) -> float:
+    """Calculate remaining balance for an already loaded invoice"""
+    # amount_paid is kept equal to the sum of payments by create_payment
+    balance = float(invoice.total) - float(invoice.amount_paid)
     return max(balance, 0.0)  # Never negative
 
 
+def recalculate_invoice_totals(session: Session, invoice: Invoice) -> None:
+    """Recompute invoice subtotal/total from its items (pending items must be flushed)"""
+    invoice_id = invoice.id
+    # lambda_stmt caches the built statement by call site; each call only binds the id
+    new_subtotal = session.exec(lambda_stmt(
+        lambda: select(func.coalesce(func.sum(InvoiceItem.subtotal), 0))
+        .where(InvoiceItem.invoice_id == invoice_id)
+    )).scalar_one()
+    invoice.subtotal = float(new_subtotal)
+    invoice.total = invoice.subtotal + float(invoice.discount_total) + float(invoice.tax_total)
+    invoice.amount_total = invoice.total
+    invoice.updated_at = datetime.utcnow()
+    session.add(invoice)
+
+
 def update_invoice_status(session: Session, invoice_id: str) -> None:
-    """Update invoice status based on payment balance and cache amount_paid/paid_at"""
+    """Update invoice status and paid_at from the cached amount_paid"""
     invoice = session.get(Invoice, invoice_id)
     if not invoice:
         return
     
-    # Calculate total paid
-    total_paid = session.exec(
-        select(func.sum(Payment.amount))
-        .where(Payment.invoice_id == invoice_id)
-    ).first() or 0.0
-    
-    balance = float(invoice.total) - float(total_paid)
-    
-    # Update amount_paid cache
-    invoice.amount_paid = total_paid
+    balance = float(invoice.total) - float(invoice.amount_paid)
     invoice.updated_at = datetime.utcnow()
     
     # Update status
@@ -200,16 +201,16 @@ def update_invoice_status(session: Session, invoice_id: str) -> None:
 
 def update_order_payment_lock(session: Session, order_id: str) -> None:
     """Update order payment lock based on invoice balance"""
-    # Get all invoices for this order
-    invoices = session.exec(
-        select(Invoice).where(Invoice.order_id == order_id)
-    ).all()
+    # Totals and cached payment sums of the order's invoices, in one query
+    rows = session.exec(lambda_stmt(
+        lambda: select(Invoice.total, Invoice.amount_paid).where(Invoice.order_id == order_id)
+    )).all()
     
-    if not invoices:
+    if not rows:
         return
     
-    # Calculate total balance across all invoices
-    total_balance = sum(calculate_invoice_balance(session, str(inv.id)) for inv in invoices)
+    # Calculate total balance across all invoices (each clamped at zero)
+    total_balance = sum(max(float(total) - float(paid), 0.0) for total, paid in rows)
     
     # Update order lock
     order = session.get(Order, order_id)
@@ -232,11 +233,21 @@ def list_invoices(
     session: Session = Depends(get_session),
     ctx: AuthContext = Depends(get_auth_ctx),
     user: AppUser = Depends(current_user),
+    limit: int = Query(100, ge=1, le=500),
+    after: Optional[UUID] = Query(None, description="Return invoices with id greater than this (keyset cursor)"),
 ):
-    """List all invoices (requires billing:read)."""
+    """List invoices ordered by id, one page at a time (requires billing:read)."""
     if not has_permission(user.id, "billing:read", session):
         raise HTTPException(403, "Permission required: billing:read")
-    invoices = session.exec(select(Invoice).where(Invoice.tenant_id == ctx.tenant_id)).all()
+    # Select only the listed columns: plain rows skip ORM instance construction
+    query = select(
+        Invoice.id, Invoice.invoice_number, Invoice.subtotal, Invoice.discount_total,
+        Invoice.tax_total, Invoice.total, Invoice.amount_paid, Invoice.currency,
+        Invoice.status, Invoice.order_id, Invoice.tenant_id, Invoice.branch_id, Invoice.paid_at,
+    ).where(Invoice.tenant_id == ctx.tenant_id)
+    if after:
+        query = query.where(Invoice.id > after)
+    invoices = session.exec(query.order_by(Invoice.id).limit(limit)).all()
     return [{
         "id": str(i.id),
         "invoice_number": i.invoice_number,
@@ -278,17 +289,6 @@ def create_invoice(
     if not order:
         raise HTTPException(404, "Order not found")
     
-    # Check if invoice_number is unique for this branch
-    existing_invoice = session.exec(
-        select(Invoice).where(
-            Invoice.invoice_number == invoice_data.invoice_number,
-            Invoice.branch_id == invoice_data.branch_id
-        )
-    ).first()
-    
-    if existing_invoice:
-        raise HTTPException(400, "Invoice number already exists for this branch")
-    
     invoice = Invoice(
         tenant_id=invoice_data.tenant_id,
         branch_id=invoice_data.branch_id,
@@ -305,7 +305,14 @@ def create_invoice(
     )
     
     session.add(invoice)
-    session.flush()  # Get invoice.id before updating locks
+    # Flush before updating locks; uq_invoice_branch_number rejects a reused number
+    try:
+        session.flush()
+    except IntegrityError as e:
+        session.rollback()
+        if constraint_name(e, Invoice.__table__) != "uq_invoice_branch_number":
+            raise
+        raise HTTPException(400, "Invoice number already exists for this branch")
 
     # Recalculate payment lock and order status so a manually created invoice
     # also blocks the order from being released before payment.
@@ -319,10 +326,9 @@ def create_invoice(
             extra={"event": "order.status_update_skipped", "order_id": str(invoice_data.order_id)},
         )
 
-    session.commit()
-    session.refresh(invoice)
-    
-    return InvoiceResponse(
+    # Every returned column was set client-side, so build the response
+    # before commit expires the instance instead of reloading it afterwards
+    response = InvoiceResponse(
         id=str(invoice.id),
         invoice_number=invoice.invoice_number,
         subtotal=float(invoice.subtotal),
@@ -337,6 +343,8 @@ def create_invoice(
         branch_id=str(invoice.branch_id),
         paid_at=invoice.paid_at,
     )
+    session.commit()
+    return response
 
 @router.get("/invoices/{invoice_id}", response_model=InvoiceDetailResponse)
 def get_invoice(
@@ -348,7 +356,9 @@ def get_invoice(
     """Get invoice details (requires billing:read)."""
     if not has_permission(user.id, "billing:read", session):
         raise HTTPException(403, "Permission required: billing:read")
-    invoice = session.get(Invoice, invoice_id)
+    # Read endpoints only serialize columns; raiseload makes any relationship
+    # access fail loudly instead of silently issuing extra queries
+    invoice = session.get(Invoice, invoice_id, options=[raiseload("*")])
     if not invoice:
         raise HTTPException(404, "Invoice not found")
     if str(invoice.tenant_id) != ctx.tenant_id:
@@ -383,7 +393,7 @@ def get_invoice_with_items(
     """Get invoice details with items and payments (requires billing:read)."""
     if not has_permission(user.id, "billing:read", session):
         raise HTTPException(403, "Permission required: billing:read")
-    invoice = session.get(Invoice, invoice_id)
+    invoice = session.get(Invoice, invoice_id, options=[raiseload("*")])
     if not invoice:
         raise HTTPException(404, "Invoice not found")
     if str(invoice.tenant_id) != ctx.tenant_id:
@@ -391,16 +401,16 @@ def get_invoice_with_items(
     
     # Get items
     items = session.exec(
-        select(InvoiceItem).where(InvoiceItem.invoice_id == invoice_id)
+        select(InvoiceItem).options(raiseload("*")).where(InvoiceItem.invoice_id == invoice_id)
     ).all()
     
     # Get payments
     payments = session.exec(
-        select(Payment).where(Payment.invoice_id == invoice_id)
+        select(Payment).options(raiseload("*")).where(Payment.invoice_id == invoice_id)
     ).all()
     
     # Calculate balance
-    balance = calculate_invoice_balance(session, invoice_id)
+    balance = calculate_invoice_balance(invoice)
     
     return InvoiceWithItemsResponse(
         id=str(invoice.id),
@@ -484,15 +494,7 @@ def add_invoice_item(
     session.flush()
     
     # Recalculate invoice totals
-    all_items = session.exec(
-        select(InvoiceItem).where(InvoiceItem.invoice_id == invoice_id)
-    ).all()
-    new_subtotal = sum(float(i.subtotal) for i in all_items)
-    invoice.subtotal = new_subtotal
-    invoice.total = new_subtotal + float(invoice.discount_total) + float(invoice.tax_total)
-    invoice.amount_total = invoice.total
-    invoice.updated_at = datetime.utcnow()
-    session.add(invoice)
+    recalculate_invoice_totals(session, invoice)
     
     # Update payment lock since invoice total changed
     update_order_payment_lock(session, str(invoice.order_id))
@@ -553,15 +555,7 @@ def update_invoice_item(
     session.flush()
     
     # Recalculate invoice totals
-    all_items = session.exec(
-        select(InvoiceItem).where(InvoiceItem.invoice_id == invoice_id)
-    ).all()
-    new_subtotal = sum(float(i.subtotal) for i in all_items)
-    invoice.subtotal = new_subtotal
-    invoice.total = new_subtotal + float(invoice.discount_total) + float(invoice.tax_total)
-    invoice.amount_total = invoice.total
-    invoice.updated_at = datetime.utcnow()
-    session.add(invoice)
+    recalculate_invoice_totals(session, invoice)
     
     # Update payment lock since invoice total changed
     update_order_payment_lock(session, str(invoice.order_id))
@@ -584,11 +578,19 @@ def list_payments(
     session: Session = Depends(get_session),
     ctx: AuthContext = Depends(get_auth_ctx),
     user: AppUser = Depends(current_user),
+    limit: int = Query(100, ge=1, le=500),
+    after: Optional[UUID] = Query(None, description="Return payments with id greater than this (keyset cursor)"),
 ):
-    """List all payments (requires billing:read)."""
+    """List payments ordered by id, one page at a time (requires billing:read)."""
     if not has_permission(user.id, "billing:read", session):
         raise HTTPException(403, "Permission required: billing:read")
-    payments = session.exec(select(Payment).where(Payment.tenant_id == ctx.tenant_id)).all()
+    query = select(
+        Payment.id, Payment.amount, Payment.currency, Payment.method, Payment.reference,
+        Payment.invoice_id, Payment.tenant_id, Payment.received_at, Payment.created_by,
+    ).where(Payment.tenant_id == ctx.tenant_id)
+    if after:
+        query = query.where(Payment.id > after)
+    payments = session.exec(query.order_by(Payment.id).limit(limit)).all()
     return [{
         "id": str(p.id),
         "amount": float(p.amount),
@@ -635,16 +637,23 @@ def create_payment(
     )
     
     session.add(payment)
-    session.flush()
-    
-    # Update invoice status based on new balance (also updates amount_paid and paid_at)
-    update_invoice_status(session, str(invoice.id))
-    
-    # Update order payment lock (billed_lock = False when balance is 0)
-    update_order_payment_lock(session, str(invoice.order_id))
-    # Recompute order status so it can move from CLOSED to RELEASED when payment is cleared
-    from app.api.v1.laboratory import update_order_status
-    update_order_status(str(invoice.order_id), session)
+    # A zero payment leaves the balance, invoice status and order lock as they
+    # were, so only the payment row itself needs writing
+    if payment_data.amount != 0:
+        # Increment the amount_paid cache in SQL (SET amount_paid = amount_paid + :x)
+        # so concurrent payments on one invoice cannot overwrite each other; the
+        # attribute is expired by the flush and reloads the incremented value
+        invoice.amount_paid = Invoice.amount_paid + payment_data.amount
+        session.flush()
+        
+        # Update invoice status and paid_at based on the new balance
+        update_invoice_status(session, str(invoice.id))
+        
+        # Update order payment lock (billed_lock = False when balance is 0)
+        update_order_payment_lock(session, str(invoice.order_id))
+        # Recompute order status so it can move from CLOSED to RELEASED when payment is cleared
+        from app.api.v1.laboratory import update_order_status
+        update_order_status(str(invoice.order_id), session)
     
     # Create payment event
     from app.models.events import OrderEvent
@@ -666,20 +675,8 @@ def create_payment(
     )
     session.add(event)
     
-    session.commit()
-    session.refresh(payment)
-    
-    logger.info(
-        f"Payment created for invoice {invoice.invoice_number}",
-        extra={
-            "event": "payment.created",
-            "payment_id": str(payment.id),
-            "invoice_id": str(invoice.id),
-            "amount": float(payment.amount),
-        },
-    )
-    
-    return PaymentResponse(
+    # Build the response before commit expires the payment (no reload needed)
+    response = PaymentResponse(
         id=str(payment.id),
         amount=float(payment.amount),
         currency=payment.currency,
@@ -690,6 +687,20 @@ def create_payment(
         received_at=payment.received_at,
         created_by=str(payment.created_by) if payment.created_by else None,
     )
+    invoice_number = invoice.invoice_number
+    session.commit()
+    
+    logger.info(
+        f"Payment created for invoice {invoice_number}",
+        extra={
+            "event": "payment.created",
+            "payment_id": response.id,
+            "invoice_id": response.invoice_id,
+            "amount": response.amount,
+        },
+    )
+    
+    return response
 
 
 @router.get("/orders/{order_id}/balance")
@@ -711,7 +722,7 @@ def get_order_balance(
     
     # Get all invoices for this order
     invoices = session.exec(
-        select(Invoice).where(Invoice.order_id == order_id)
+        select(Invoice).options(raiseload("*")).where(Invoice.order_id == order_id)
     ).all()
     
     total_invoiced = sum(float(inv.total) for inv in invoices)
@@ -730,7 +741,7 @@ def get_order_balance(
                 "invoice_number": inv.invoice_number,
                 "total": float(inv.total),
                 "status": inv.status,
-                "balance": calculate_invoice_balance(session, str(inv.id)),
+                "balance": max(float(inv.total) - float(inv.amount_paid), 0.0),
             }
             for inv in invoices
         ]
@@ -756,7 +767,7 @@ def get_order_invoice(
     
     # Get invoice by order_id
     invoice = session.exec(
-        select(Invoice).where(Invoice.order_id == order_id)
+        select(Invoice).options(raiseload("*")).where(Invoice.order_id == order_id)
     ).first()
     
     if not invoice:
@@ -764,16 +775,16 @@ def get_order_invoice(
     
     # Get items
     items = session.exec(
-        select(InvoiceItem).where(InvoiceItem.invoice_id == invoice.id)
+        select(InvoiceItem).options(raiseload("*")).where(InvoiceItem.invoice_id == invoice.id)
     ).all()
     
     # Get payments
     payments = session.exec(
-        select(Payment).where(Payment.invoice_id == invoice.id)
+        select(Payment).options(raiseload("*")).where(Payment.invoice_id == invoice.id)
     ).all()
     
     # Calculate balance
-    balance = calculate_invoice_balance(session, str(invoice.id))
+    balance = calculate_invoice_balance(invoice)
     
     return InvoiceWithItemsResponse(
         id=str(invoice.id),
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import selectinload
 from sqlmodel import select, Session
 from app.core.db import get_session
 from app.api.v1.auth import get_auth_ctx, AuthContext, current_user
-from app.core.rbac import has_permission, get_user_roles, FULL_BRANCH_ACCESS_ROLES
+from app.core.rbac import has_permission, get_roles_for_users, FULL_BRANCH_ACCESS_ROLES
 from app.models.tenant import Branch, Tenant
-from app.models.user import AppUser
+from app.models.user import AppUser, UserBranch
 from app.models.user_role import UserRoleLink
 from app.models.role import Role
 from app.schemas.tenant import BranchCreate, BranchResponse, BranchDetailResponse
@@ -17,12 +20,18 @@ def list_branches(
     session: Session = Depends(get_session),
     ctx: AuthContext = Depends(get_auth_ctx),
     user: AppUser = Depends(current_user),
+    limit: int = Query(100, ge=1, le=500),
+    after: Optional[UUID] = Query(None, description="Return branches with id greater than this (keyset cursor)"),
 ):
-    """List all branches (requires lab:read)."""
+    """List branches ordered by id, one page at a time (requires lab:read)."""
     if not has_permission(user.id, "lab:read", session):
         raise HTTPException(403, "Permission required: lab:read")
 
-    branches = session.exec(select(Branch).where(Branch.tenant_id == ctx.tenant_id)).all()
+    # Select only the listed columns: plain rows skip ORM instance construction
+    query = select(Branch.id, Branch.name, Branch.code, Branch.tenant_id).where(Branch.tenant_id == ctx.tenant_id)
+    if after:
+        query = query.where(Branch.id > after)
+    branches = session.exec(query.order_by(Branch.id).limit(limit)).all()
     return [{"id": str(b.id), "name": b.name, "code": b.code, "tenant_id": str(b.tenant_id)} for b in branches]
 
 
@@ -108,44 +117,37 @@ def list_branch_users(
     if not has_permission(user.id, "lab:read", session):
         raise HTTPException(403, "Permission required: lab:read")
 
-    branch = session.get(Branch, branch_id)
+    # Members and their users come back in two IN queries instead of one per row
+    branch = session.exec(
+        select(Branch)
+        .where(Branch.id == branch_id)
+        .options(selectinload(Branch.users).selectinload(UserBranch.user))
+    ).first()
     if not branch:
         raise HTTPException(404, "Branch not found")
     if str(branch.tenant_id) != ctx.tenant_id:
         raise HTTPException(404, "Branch not found")
 
-    users_dict = {}
-
     # Explicitly assigned users
-    for ub in branch.users:
-        u = ub.user
-        users_dict[u.id] = {
+    members = {ub.user.id: ub.user for ub in branch.users}
+
+    # Users with full-branch-access roles (admin / superuser) — implicit access
+    full_access_users = session.exec(
+        select(AppUser)
+        .join(UserRoleLink, UserRoleLink.user_id == AppUser.id)
+        .join(Role, Role.id == UserRoleLink.role_id)
+        .where(Role.code.in_(FULL_BRANCH_ACCESS_ROLES), AppUser.tenant_id == ctx.tenant_id)
+    ).all()
+    for u in full_access_users:
+        members.setdefault(u.id, u)
+
+    roles = get_roles_for_users(members, session)
+    return [
+        {
             "id": str(u.id),
             "email": u.email,
             "full_name": u.full_name,
-            "roles": get_user_roles(u.id, session),
+            "roles": roles[u.id],
         }
-
-    # Users with full-branch-access roles (admin / superuser) — implicit access
-    full_access_roles = session.exec(
-        select(Role).where(Role.code.in_(FULL_BRANCH_ACCESS_ROLES))
-    ).all()
-    full_access_role_ids = {r.id for r in full_access_roles}
-
-    if full_access_role_ids:
-        admin_links = session.exec(
-            select(UserRoleLink).where(UserRoleLink.role_id.in_(full_access_role_ids))
-        ).all()
-        for link in admin_links:
-            if link.user_id in users_dict:
-                continue
-            u = session.get(AppUser, link.user_id)
-            if u and str(u.tenant_id) == ctx.tenant_id:
-                users_dict[link.user_id] = {
-                    "id": str(u.id),
-                    "email": u.email,
-                    "full_name": u.full_name,
-                    "roles": get_user_roles(u.id, session),
-                }
-
-    return list(users_dict.values())
+        for u in members.values()
+    ]
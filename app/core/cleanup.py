@@ -4,49 +4,56 @@ Cleanup utility for expired blacklisted tokens
 This script removes tokens that have expired from the blacklist
 """
 
+import asyncio
+import logging
 from datetime import datetime
+from sqlalchemy import delete
 from sqlmodel import select, Session
-from app.core.db import get_session
+from app.core.db import engine, get_session
 from app.models.user import BlacklistedToken
 
-def cleanup_expired_tokens(session: Session) -> int:
+logger = logging.getLogger(__name__)
+
+# Rows removed per DELETE; each batch commits on its own so row locks and
+# WAL per transaction stay bounded however large the backlog is.
+CLEANUP_BATCH_SIZE = 5000
+
+def _delete_in_batches(session: Session, condition, batch_size: int) -> int:
+    """Delete blacklisted tokens matching ``condition`` in id-keyed batches."""
+    removed = 0
+    while True:
+        batch = select(BlacklistedToken.id).where(condition).limit(batch_size)
+        result = session.exec(delete(BlacklistedToken).where(BlacklistedToken.id.in_(batch)))
+        session.commit()
+        removed += result.rowcount
+        if result.rowcount < batch_size:
+            return removed
+
+def cleanup_expired_tokens(session: Session, batch_size: int = CLEANUP_BATCH_SIZE) -> int:
     """
     Remove expired tokens from the blacklist
     
     Args:
         session: Database session
+        batch_size: Maximum rows deleted per transaction
         
     Returns:
         int: Number of tokens removed
     """
     try:
-        # Find all expired tokens
-        expired_tokens = session.exec(
-            select(BlacklistedToken).where(BlacklistedToken.expires_at < datetime.utcnow())
-        ).all()
-        
-        if not expired_tokens:
-            return 0
-        
-        # Remove expired tokens
-        count = len(expired_tokens)
-        for token in expired_tokens:
-            session.delete(token)
-        
-        session.commit()
-        return count
-        
+        return _delete_in_batches(session, BlacklistedToken.expires_at < datetime.utcnow(), batch_size)
     except Exception as e:
         session.rollback()
         raise e
 
-def cleanup_old_blacklisted_tokens(session: Session, days_old: int = 30) -> int:
+def cleanup_old_blacklisted_tokens(session: Session, days_old: int = 30, batch_size: int = CLEANUP_BATCH_SIZE) -> int:
     """
     Remove blacklisted tokens older than specified days
     
     Args:
         session: Database session
         days_old: Remove tokens older than this many days
+        batch_size: Maximum rows deleted per transaction
         
     Returns:
         int: Number of tokens removed
@@ -55,26 +62,32 @@ def cleanup_old_blacklisted_tokens(session: Session, days_old: int = 30) -> int:
         from datetime import timedelta
         
         cutoff_date = datetime.utcnow() - timedelta(days=days_old)
-        
-        old_tokens = session.exec(
-            select(BlacklistedToken).where(BlacklistedToken.blacklisted_at < cutoff_date)
-        ).all()
-        
-        if not old_tokens:
-            return 0
-        
-        # Remove old tokens
-        count = len(old_tokens)
-        for token in old_tokens:
-            session.delete(token)
-        
-        session.commit()
-        return count
-        
+        return _delete_in_batches(session, BlacklistedToken.blacklisted_at < cutoff_date, batch_size)
     except Exception as e:
         session.rollback()
         raise e
 
+async def run_periodic_token_cleanup(interval_seconds: int) -> None:
+    """
+    Remove expired blacklisted tokens every ``interval_seconds`` until cancelled
+
+    Started from the application lifespan so the blacklist (and its index)
+    stays bounded by the number of live sessions rather than by every logout
+    ever made.
+    """
+    def _run_once() -> int:
+        with Session(engine) as session:
+            return cleanup_expired_tokens(session)
+
+    while True:
+        try:
+            removed = await asyncio.to_thread(_run_once)
+            if removed:
+                logger.info("Removed %d expired blacklisted tokens", removed)
+        except Exception:
+            logger.exception("Blacklisted token cleanup failed")
+        await asyncio.sleep(interval_seconds)
+
 def get_blacklist_stats(session: Session) -> dict:
     """
     Get statistics about the blacklisted tokens
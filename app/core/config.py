@@ -4,8 +4,12 @@ class Settings(BaseSettings):
     app_name: str = "celuma"
     env: str = "dev"
     database_url: str
+    db_pool_size: int = 20
+    db_max_overflow: int = 10
+    db_pool_recycle_seconds: int = 3600  # replace pooled connections older than this
     jwt_secret: str
     jwt_expires_min: int = 480
+    token_cleanup_interval_min: int = 60  # 0 disables the background blacklist cleanup
 
     # AWS S3 configuration
     aws_access_key_id: str | None = None
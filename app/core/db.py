@@ -1,8 +1,38 @@
+from typing import Optional
+from sqlalchemy import Table, UniqueConstraint
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import SQLModel, create_engine, Session
 from app.core.config import settings
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+# SQLite (tests, local scripts) uses its own pool classes without overflow settings
+_pool_options = {} if settings.database_url.startswith("sqlite") else {
+    "pool_size": settings.db_pool_size,
+    "max_overflow": settings.db_max_overflow,
+    "pool_recycle": settings.db_pool_recycle_seconds,
+}
+
+engine = create_engine(settings.database_url, pool_pre_ping=True, **_pool_options)
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+
+def constraint_name(exc: IntegrityError, table: Table) -> Optional[str]:
+    """Return the name of the unique constraint on ``table`` that ``exc`` violated, if known."""
+    name = getattr(getattr(exc.orig, "diag", None), "constraint_name", None)
+    if name is not None:
+        return name
+    message = str(exc.orig)
+    uniques = [c for c in table.constraints if isinstance(c, UniqueConstraint) and c.name]
+    # Drivers without psycopg2's diag still name the constraint in the message
+    for constraint in uniques:
+        if constraint.name in message:
+            return constraint.name
+    # SQLite lists the columns instead: "UNIQUE constraint failed: t.a, t.b"
+    if message.startswith("UNIQUE constraint failed: "):
+        failed = {column.strip() for column in message.split(": ", 1)[1].split(",")}
+        for constraint in uniques:
+            if {f"{table.name}.{column.name}" for column in constraint.columns} == failed:
+                return constraint.name
+    return None
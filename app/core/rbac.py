@@ -4,7 +4,7 @@ RBAC core — pure permission/role resolution functions.
 No imports from app.api layer to avoid circular dependencies.
 FastAPI dependency factories live in app/api/deps.py.
 """
-from typing import Set, List
+from typing import Dict, Iterable, Set, List
 from uuid import UUID
 
 from sqlmodel import Session, select
@@ -58,6 +58,22 @@ def get_user_roles(user_id: UUID, session: Session) -> List[str]:
     return list(rows)
 
 
+def get_roles_for_users(user_ids: Iterable[UUID], session: Session) -> Dict[UUID, List[str]]:
+    """Return role codes for several users at once, keyed by user id."""
+    ids = list(user_ids)
+    roles: Dict[UUID, List[str]] = {user_id: [] for user_id in ids}
+    if not ids:
+        return roles
+    rows = session.exec(
+        select(UserRoleLink.user_id, Role.code)
+        .join(Role, Role.id == UserRoleLink.role_id)
+        .where(UserRoleLink.user_id.in_(ids))
+    ).all()
+    for user_id, code in rows:
+        roles[user_id].append(code)
+    return roles
+
+
 def has_permission(user_id: UUID, permission_code: str, session: Session) -> bool:
     """Check if a user holds a specific permission."""
     return permission_code in get_user_permissions(user_id, session)
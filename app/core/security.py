@@ -1,6 +1,12 @@
+import hashlib
+import secrets
+import threading
+import time
 from datetime import datetime, timedelta
+from typing import Dict, Tuple
 from passlib.context import CryptContext
-from jose import jwt, JWTError
+import jwt
+from jwt import InvalidTokenError
 from app.core.config import settings
 
 # Use pbkdf2_sha256 exclusively - no 72-byte password limit, more secure,
@@ -17,18 +23,66 @@ def hash_password(password: str) -> str:
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
+# Hash of a random throwaway password. Login verifies against it when no
+# account matches, so an unknown user costs the same as a wrong password.
+_DUMMY_HASH = hash_password(secrets.token_urlsafe(16))
+
+def dummy_verify_password(plain: str) -> bool:
+    """Spend one password verification without a real hash; always False."""
+    pwd_context.verify(plain, _DUMMY_HASH)
+    return False
+
+# The signing secret is fixed for the process; encode it once rather than
+# letting PyJWT convert the str key on every encode/decode
+_JWT_KEY = settings.jwt_secret.encode()
+
 def create_jwt(sub: str) -> str:
     exp = datetime.utcnow() + timedelta(minutes=settings.jwt_expires_min)
-    return jwt.encode({"sub": sub, "exp": exp}, settings.jwt_secret, algorithm="HS256")
+    return jwt.encode({"sub": sub, "exp": exp}, _JWT_KEY, algorithm="HS256")
+
+def hash_token(token: str) -> str:
+    """Return the hex SHA-256 digest used to identify a token."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+# Verified JWT payloads keyed by token digest, each kept until the token's
+# exp, so a token reused across requests is only HMAC-verified once.
+MAX_CACHED_JWTS = 10_000
+_verified_jwts: Dict[str, Tuple[dict, float]] = {}
+_verified_jwts_lock = threading.Lock()
 
 def decode_jwt(token: str) -> dict:
     """Decode JWT token and return payload"""
+    key = hash_token(token)
+    now = time.time()
+
+    cached = _verified_jwts.get(key)
+    if cached is not None:
+        payload, exp = cached
+        if now < exp:
+            return dict(payload)
+        with _verified_jwts_lock:
+            _verified_jwts.pop(key, None)
+
     try:
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
-        return payload
-    except JWTError:
+        # Every token we issue carries sub and exp; reject any that doesn't
+        payload = jwt.decode(
+            token, _JWT_KEY, algorithms=["HS256"],
+            options={"require": ["exp", "sub"]},
+        )
+    except InvalidTokenError:
         return None
 
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        with _verified_jwts_lock:
+            if len(_verified_jwts) >= MAX_CACHED_JWTS:
+                for stale in [k for k, (_, until) in _verified_jwts.items() if until <= now]:
+                    del _verified_jwts[stale]
+                if len(_verified_jwts) >= MAX_CACHED_JWTS:
+                    _verified_jwts.clear()
+            _verified_jwts[key] = (dict(payload), exp)
+    return payload
+
 def is_token_expired(token: str) -> bool:
     """Check if a JWT token is expired"""
     payload = decode_jwt(token)
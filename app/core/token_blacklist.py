@@ -0,0 +1,77 @@
+"""
+In-process cache for JWT blacklist lookups.
+
+Every authenticated request checks its token against ``blacklisted_token``.
+A revoked token stays revoked until it expires, and live tokens are rarely
+revoked, so both answers are cached here keyed by the token's SHA-256 digest.
+"""
+
+import threading
+import time
+from typing import Dict, Tuple
+from sqlalchemy import exists, lambda_stmt
+from sqlmodel import select, Session
+from app.core.security import hash_token
+from app.models.user import BlacklistedToken
+
+# How long a "not revoked" answer is trusted. A logout handled by another
+# worker process takes effect here after at most this many seconds; the
+# worker that handled it sees it immediately through mark_token_revoked().
+NOT_REVOKED_TTL_SECONDS = 30
+
+MAX_CACHED_TOKENS = 100_000
+
+# digest -> (revoked, cache entry valid until as a unix timestamp)
+_cache: Dict[str, Tuple[bool, float]] = {}
+_lock = threading.Lock()
+
+
+def _store(key: str, revoked: bool, valid_until: float, now: float) -> None:
+    with _lock:
+        if len(_cache) >= MAX_CACHED_TOKENS:
+            for stale in [k for k, (_, until) in _cache.items() if until <= now]:
+                del _cache[stale]
+            if len(_cache) >= MAX_CACHED_TOKENS:
+                _cache.clear()
+        _cache[key] = (revoked, valid_until)
+
+
+def is_token_revoked(session: Session, token: str, expires_at: float) -> bool:
+    """
+    Check whether a token has been blacklisted
+
+    Args:
+        session: Database session, only used on a cache miss
+        token: Raw JWT
+        expires_at: The token's ``exp`` claim as a unix timestamp
+
+    Returns:
+        bool: True if the token was revoked through logout
+    """
+    key = hash_token(token)
+    now = time.time()
+
+    cached = _cache.get(key)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    # lambda_stmt caches the built statement by call site, so each miss only
+    # binds the new digest instead of rebuilding and re-keying the select
+    revoked = session.exec(
+        lambda_stmt(lambda: select(exists().where(BlacklistedToken.token_hash == key)))
+    ).scalar_one()
+
+    valid_until = expires_at if revoked else min(expires_at, now + NOT_REVOKED_TTL_SECONDS)
+    _store(key, revoked, valid_until, now)
+    return revoked
+
+
+def mark_token_revoked(token: str, expires_at: float) -> None:
+    """Record a freshly blacklisted token so this process rejects it at once."""
+    _store(hash_token(token), True, expires_at, time.time())
+
+
+def clear_cache() -> None:
+    """Drop every cached answer."""
+    with _lock:
+        _cache.clear()
@@ -6,7 +6,7 @@ import logging
 import os
 import time
 import uuid
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from collections import defaultdict
 import asyncio
 from app.api.v1.users import router as users_router
@@ -25,6 +25,8 @@ from app.api.v1.dashboard import router as dashboard_router
 from app.api.v1.portal import router as portal_router
 from app.api.v1.worklist import router as worklist_router
 from app.api.v1.rbac import router as rbac_router
+from app.core.cleanup import run_periodic_token_cleanup
+from app.core.config import settings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -34,7 +36,17 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("🚀 Celuma API starting up...")
+    cleanup_task = None
+    if settings.token_cleanup_interval_min > 0:
+        cleanup_task = asyncio.create_task(
+            run_periodic_token_cleanup(settings.token_cleanup_interval_min * 60)
+        )
     yield
+    if cleanup_task is not None:
+        cleanup_task.cancel()
+        # Wait for the cancellation so the task doesn't outlive the loop
+        with suppress(asyncio.CancelledError):
+            await cleanup_task
     logger.info("🛑 Celuma API shutting down...")
 
 app = FastAPI(
@@ -18,7 +18,7 @@ class Assignment(BaseModel, TenantMixin, table=True):
     __tablename__ = "assignment"
     
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    tenant_id: UUID = Field(foreign_key="tenant.id", index=True)
+    tenant_id: UUID = Field(foreign_key="tenant.id")
     
     # What type of item this assignment is for
     item_type: AssignmentItemType = Field(
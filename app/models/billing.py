@@ -13,7 +13,7 @@ class InvoiceItem(BaseModel, TimestampMixin, TenantMixin, table=True):
     
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     tenant_id: UUID = Field(foreign_key="tenant.id")
-    invoice_id: UUID = Field(foreign_key="invoice.id")
+    invoice_id: UUID = Field(foreign_key="invoice.id", index=True)
     study_type_id: Optional[UUID] = Field(foreign_key="study_type.id", default=None)
     description: str = Field(max_length=500)
     quantity: int = Field(default=1)
@@ -27,13 +27,16 @@ class InvoiceItem(BaseModel, TimestampMixin, TenantMixin, table=True):
 class Invoice(BaseModel, TimestampMixin, TenantMixin, BranchMixin, table=True):
     """Invoice model for laboratory billing"""
     __tablename__ = "invoice"
-    __table_args__ = (UniqueConstraint("order_id", name="uq_invoice_order_id"),)
+    __table_args__ = (
+        UniqueConstraint("order_id", name="uq_invoice_order_id"),
+        UniqueConstraint("branch_id", "invoice_number", name="uq_invoice_branch_number"),
+    )
     
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     tenant_id: UUID = Field(foreign_key="tenant.id")
     branch_id: UUID = Field(foreign_key="branch.id")
     order_id: UUID = Field(foreign_key="order.id")
-    invoice_number: str = Field(max_length=100)  # Unique per branch
+    invoice_number: str = Field(max_length=100)  # Unique per branch (uq_invoice_branch_number)
     subtotal: float = Field(sa_type=Numeric(12, 2), default=0)
     discount_total: float = Field(sa_type=Numeric(12, 2), default=0)
     tax_total: float = Field(sa_type=Numeric(12, 2), default=0)
@@ -57,7 +60,7 @@ class Payment(BaseModel, TimestampMixin, TenantMixin, table=True):
     
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     tenant_id: UUID = Field(foreign_key="tenant.id")
-    invoice_id: UUID = Field(foreign_key="invoice.id")
+    invoice_id: UUID = Field(foreign_key="invoice.id", index=True)
     amount: float = Field(sa_type=Numeric(12, 2))
     currency: str = Field(default="MXN", max_length=3)
     method: Optional[str] = Field(max_length=100, default=None)  # cash, card, transfer, other
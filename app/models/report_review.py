@@ -21,7 +21,7 @@ class ReportReview(BaseModel, TenantMixin, table=True):
     __tablename__ = "report_review"
     
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    tenant_id: UUID = Field(foreign_key="tenant.id", index=True)
+    tenant_id: UUID = Field(foreign_key="tenant.id")
     
     # Link to the order (NOT NULL - reviews are per order)
     order_id: UUID = Field(foreign_key="order.id", index=True)
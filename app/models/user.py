@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional, List, TYPE_CHECKING
 from uuid import UUID, uuid4
-from sqlmodel import SQLModel, Field, Relationship
+from sqlmodel import SQLModel, Field, Relationship, UniqueConstraint
 from .base import BaseModel, TimestampMixin, TenantMixin
 
 if TYPE_CHECKING:
@@ -11,6 +11,10 @@ if TYPE_CHECKING:
 class AppUser(BaseModel, TimestampMixin, TenantMixin, table=True):
     """Application user model with multi-tenant support."""
     __tablename__ = "app_user"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "email", name="uq_app_user_tenant_email"),
+        UniqueConstraint("tenant_id", "username", name="uq_app_user_tenant_username"),
+    )
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     tenant_id: UUID = Field(foreign_key="tenant.id")
@@ -45,7 +49,7 @@ class BlacklistedToken(BaseModel, table=True):
     __tablename__ = "blacklisted_token"
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    token: str = Field(max_length=1000, index=True, unique=True)
+    token_hash: str = Field(max_length=64, index=True, unique=True)  # hex sha256 of token
     user_id: UUID = Field(foreign_key="app_user.id")
     expires_at: datetime = Field()
     blacklisted_at: datetime = Field(default_factory=datetime.utcnow)
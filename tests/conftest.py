@@ -1,9 +1,11 @@
 """
 Pytest configuration and fixtures for Celuma API unit tests
 """
+import uuid
 import pytest
 from unittest.mock import Mock, patch
-from sqlmodel import Session, create_engine
+from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy import Uuid
 from sqlalchemy.pool import StaticPool
 
 # Mock database for unit tests
@@ -18,6 +20,36 @@ def mock_session():
     with Session(engine) as session:
         yield session
 
+class _StrUuid(Uuid):
+    """Uuid that also binds string values, as psycopg2 does for Postgres UUID columns."""
+
+    def bind_processor(self, dialect):
+        process = super().bind_processor(dialect)
+        if process is None:
+            return None
+        return lambda value: process(uuid.UUID(value) if isinstance(value, str) else value)
+
+
+@pytest.fixture
+def db_session():
+    """In-memory SQLite session with every table created, for calling endpoints directly.
+
+    Endpoints pass ids around as strings. SQLite's UUID emulation only accepts
+    uuid.UUID, so this engine's dialect alone maps Uuid columns to _StrUuid;
+    the Uuid type itself and every other engine are left untouched.
+    """
+    import app.models  # noqa: F401 - register every table on SQLModel.metadata
+
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    engine.dialect.colspecs = {**engine.dialect.colspecs, Uuid: _StrUuid}
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
 @pytest.fixture
 def mock_current_user():
     """Mock authenticated user for testing"""
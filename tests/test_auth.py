@@ -0,0 +1,305 @@
+"""
+Auth endpoint tests.
+
+Endpoints are called directly against the in-memory SQLite session from
+conftest. Per-tenant email/username uniqueness is enforced only by the
+app_user unique constraints, so these tests exercise the real IntegrityError
+path rather than a pre-check.
+"""
+import uuid
+import pytest
+from types import SimpleNamespace
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy.exc import IntegrityError
+from starlette.requests import Request
+from sqlmodel import Session
+
+from app.api.v1 import auth as auth_api
+from app.api.v1.auth import register, login, update_me, unified_registration, user_conflict, logout, current_user
+from app.core import token_blacklist
+from app.core.security import create_jwt, decode_jwt
+from app.models.role import Role
+from app.models.tenant import Tenant
+from app.models.user import AppUser
+from app.schemas.auth import (
+    UserRegister,
+    UserLogin,
+    UserProfileUpdate,
+    RegistrationRequest,
+    LoginResponse,
+    LoginTenantSelectionResponse,
+)
+
+
+@pytest.fixture(name="tenant")
+def tenant_fixture(db_session: Session) -> Tenant:
+    for code in ("viewer", "admin", "superuser"):
+        db_session.add(Role(id=uuid.uuid4(), code=code, name=code, is_system=True))
+    tenant = Tenant(name="Lab")
+    db_session.add(tenant)
+    db_session.commit()
+    return tenant
+
+
+def _register(session: Session, tenant_id, email="ana@example.com", username="ana"):
+    data = UserRegister(
+        email=email,
+        username=username,
+        password="secret-pass",
+        full_name="Ana Lopez",
+        role="viewer",
+        tenant_id=str(tenant_id),
+    )
+    return register(data, session=session)
+
+
+def _login(session: Session, username_or_email, password="secret-pass", tenant_id=None):
+    data = UserLogin(
+        username_or_email=username_or_email,
+        password=password,
+        tenant_id=str(tenant_id) if tenant_id else None,
+    )
+    return login(data, session=session)
+
+
+def _login_error(session: Session, *args, **kwargs) -> HTTPException:
+    with pytest.raises(HTTPException) as exc:
+        _login(session, *args, **kwargs)
+    return exc.value
+
+
+def _deactivate(session: Session, user_id) -> None:
+    user = session.get(AppUser, uuid.UUID(user_id))
+    user.is_active = False
+    session.commit()
+
+
+def _request() -> Request:
+    return Request({"type": "http", "headers": []})
+
+
+def _update_me(session: Session, user_id, **fields):
+    request = _request()
+    user = session.get(AppUser, user_id)
+    return update_me(request, UserProfileUpdate(**fields), user=user, session=session)
+
+
+def _integrity_error(orig: Exception) -> IntegrityError:
+    return IntegrityError("INSERT INTO app_user ...", {}, orig)
+
+
+class TestRegisterConflicts:
+    """Verify duplicate email/username per tenant become 400s"""
+
+    def test_duplicate_email_in_tenant(self, db_session, tenant):
+        _register(db_session, tenant.id)
+        with pytest.raises(HTTPException) as exc:
+            _register(db_session, tenant.id, username="other")
+        assert exc.value.status_code == 400
+        assert exc.value.detail == "Email already registered for this tenant"
+
+    def test_duplicate_username_in_tenant(self, db_session, tenant):
+        _register(db_session, tenant.id)
+        with pytest.raises(HTTPException) as exc:
+            _register(db_session, tenant.id, email="other@example.com")
+        assert exc.value.status_code == 400
+        assert exc.value.detail == "Username already registered for this tenant"
+
+    def test_same_email_in_another_tenant_is_allowed(self, db_session, tenant):
+        other = Tenant(name="Other lab")
+        db_session.add(other)
+        db_session.commit()
+        first = _register(db_session, tenant.id)
+        second = _register(db_session, other.id)
+        assert first.id != second.id
+        assert second.email == first.email
+
+
+class TestUpdateMeConflicts:
+    """Verify profile updates map constraint violations, and report them before password errors"""
+
+    @pytest.fixture(name="users")
+    def users_fixture(self, db_session, tenant):
+        ana = _register(db_session, tenant.id)
+        bob = _register(db_session, tenant.id, email="bob@example.com", username="bob")
+        return uuid.UUID(ana.id), uuid.UUID(bob.id)
+
+    @pytest.mark.parametrize("fields, message", [
+        ({"username": "bob"}, "Username already registered for this tenant"),
+        ({"email": "bob@example.com"}, "Email already registered for this tenant"),
+    ])
+    def test_conflict_is_rejected(self, db_session, users, fields, message):
+        with pytest.raises(HTTPException) as exc:
+            _update_me(db_session, users[0], **fields)
+        assert exc.value.status_code == 400
+        assert exc.value.detail == message
+
+    def test_conflict_is_reported_before_wrong_password(self, db_session, users):
+        with pytest.raises(HTTPException) as exc:
+            _update_me(db_session, users[0], username="bob", current_password="wrong", new_password="new-secret")
+        assert exc.value.detail == "Username already registered for this tenant"
+
+    def test_wrong_password_is_rejected(self, db_session, users):
+        with pytest.raises(HTTPException) as exc:
+            _update_me(db_session, users[0], username="ana2", current_password="wrong", new_password="new-secret")
+        assert exc.value.detail == "Current password is incorrect"
+
+    def test_free_username_and_email_are_saved(self, db_session, users):
+        profile = _update_me(db_session, users[0], username="ana2", email="ana2@example.com")
+        assert (profile.username, profile.email) == ("ana2", "ana2@example.com")
+        stored = db_session.get(AppUser, users[0])
+        assert (stored.username, stored.email) == ("ana2", "ana2@example.com")
+
+
+class TestLogin:
+    """Verify login lookups by email/username, globally and per tenant"""
+
+    @pytest.fixture(name="other_tenant")
+    def other_tenant_fixture(self, db_session):
+        other = Tenant(name="Other lab")
+        db_session.add(other)
+        db_session.commit()
+        return other
+
+    @pytest.mark.parametrize("login_name", ["ana@example.com", "ana"])
+    def test_single_tenant_login(self, db_session, tenant, login_name):
+        user_id = _register(db_session, tenant.id).id
+        _register(db_session, tenant.id, email="bob@example.com", username="bob")
+
+        response = _login(db_session, login_name)
+        assert isinstance(response, LoginResponse)
+        assert response.tenant_id == str(tenant.id)
+        assert decode_jwt(response.access_token)["sub"] == user_id
+
+    @pytest.mark.parametrize("login_name", ["ana@example.com", "ana"])
+    def test_tenant_scoped_login(self, db_session, tenant, other_tenant, login_name):
+        _register(db_session, tenant.id)
+        other_id = _register(db_session, other_tenant.id).id
+
+        response = _login(db_session, login_name, tenant_id=other_tenant.id)
+        assert response.tenant_id == str(other_tenant.id)
+        assert decode_jwt(response.access_token)["sub"] == other_id
+
+    def test_user_in_several_tenants_must_pick_one(self, db_session, tenant, other_tenant):
+        _register(db_session, tenant.id)
+        _register(db_session, other_tenant.id)
+
+        response = _login(db_session, "ana")
+        assert isinstance(response, LoginTenantSelectionResponse)
+        assert response.need_tenant_selection is True
+        assert {o.tenant_id for o in response.options} == {str(tenant.id), str(other_tenant.id)}
+
+    def test_tenant_options_carry_tenant_names(self, db_session, tenant, other_tenant):
+        _register(db_session, tenant.id)
+        _register(db_session, other_tenant.id)
+
+        response = _login(db_session, "ana@example.com")
+        names = {o.tenant_id: o.tenant_name for o in response.options}
+        assert names == {str(tenant.id): "Lab", str(other_tenant.id): "Other lab"}
+
+    def test_wrong_password_is_rejected(self, db_session, tenant):
+        _register(db_session, tenant.id)
+        error = _login_error(db_session, "ana", password="wrong")
+        assert (error.status_code, error.detail) == (401, "Invalid credentials")
+
+    def test_inactive_user_gets_the_unknown_user_error(self, db_session, tenant):
+        _deactivate(db_session, _register(db_session, tenant.id).id)
+        inactive = _login_error(db_session, "ana")
+        unknown = _login_error(db_session, "nobody")
+        assert (inactive.status_code, inactive.detail) == (unknown.status_code, unknown.detail) == (401, "Invalid credentials")
+
+    def test_inactive_accounts_are_not_tenant_options(self, db_session, tenant, other_tenant):
+        third = Tenant(name="Third lab")
+        db_session.add(third)
+        db_session.commit()
+        _register(db_session, tenant.id)
+        _register(db_session, other_tenant.id)
+        _deactivate(db_session, _register(db_session, third.id).id)
+
+        response = _login(db_session, "ana")
+        assert {o.tenant_id for o in response.options} == {str(tenant.id), str(other_tenant.id)}
+
+    def test_only_active_account_logs_in_directly(self, db_session, tenant, other_tenant):
+        _register(db_session, tenant.id)
+        _deactivate(db_session, _register(db_session, other_tenant.id).id)
+
+        response = _login(db_session, "ana")
+        assert isinstance(response, LoginResponse)
+        assert response.tenant_id == str(tenant.id)
+
+    def test_unknown_user_pays_for_a_dummy_hash_on_both_paths(self, db_session, tenant, monkeypatch):
+        _register(db_session, tenant.id)
+        dummy_calls = []
+        dummy_verify = auth_api.dummy_verify_password
+        monkeypatch.setattr(auth_api, "dummy_verify_password", lambda password: dummy_calls.append(password) or dummy_verify(password))
+        monkeypatch.setattr(auth_api, "verify_password", lambda *args: pytest.fail("no account to verify against"))
+
+        scoped = _login_error(db_session, "nobody", tenant_id=tenant.id)
+        unscoped = _login_error(db_session, "nobody")
+        # Same branch on both paths: one dummy hash, then the generic 401
+        assert dummy_calls == ["secret-pass", "secret-pass"]
+        assert (scoped.status_code, scoped.detail) == (unscoped.status_code, unscoped.detail) == (401, "Invalid credentials")
+
+    @pytest.mark.parametrize("scoped", [False, True])
+    def test_unknown_user_is_rejected(self, db_session, tenant, scoped):
+        _register(db_session, tenant.id)
+        error = _login_error(db_session, "nobody@example.com", tenant_id=tenant.id if scoped else None)
+        assert (error.status_code, error.detail) == (401, "Invalid credentials")
+
+
+class TestLogout:
+    """Verify logout blacklists a token once and the token stops authenticating"""
+
+    @pytest.fixture(autouse=True)
+    def empty_blacklist_cache(self):
+        token_blacklist.clear_cache()
+        yield
+        token_blacklist.clear_cache()
+
+    def test_repeated_logout_then_token_is_rejected(self, db_session, tenant):
+        user_id = _register(db_session, tenant.id).id
+        token = HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_jwt(user_id))
+        assert current_user(_request(), token=token, session=db_session).id == uuid.UUID(user_id)
+
+        first = logout(token=token, session=db_session)
+        second = logout(token=token, session=db_session)
+        assert (first.token_revoked, second.token_revoked) == (True, False)
+
+        # Drop the in-process answer so the rejection comes from the stored row
+        token_blacklist.clear_cache()
+        with pytest.raises(HTTPException) as exc:
+            current_user(_request(), token=token, session=db_session)
+        assert exc.value.status_code == 401
+        assert exc.value.detail == "Token has been revoked"
+
+
+class TestUnifiedRegistration:
+    """Verify each unified registration gets its own tenant namespace"""
+
+    def test_same_admin_email_in_two_new_tenants(self, db_session, tenant):
+        payload = RegistrationRequest(
+            tenant={"name": "Lab"},
+            branch={"code": "MAIN", "name": "Main"},
+            admin_user={"email": "admin@example.com", "username": "admin", "password": "secret-pass", "full_name": "Admin"},
+        )
+        first = unified_registration(payload, session=db_session)
+        second = unified_registration(payload, session=db_session)
+        assert first.tenant_id != second.tenant_id
+
+
+class TestUserConflict:
+    """Verify constraint detection with and without psycopg2's diag"""
+
+    def test_reads_diag_constraint_name(self):
+        orig = Exception("duplicate key")
+        orig.diag = SimpleNamespace(constraint_name="uq_app_user_tenant_username")
+        assert user_conflict(_integrity_error(orig))[0] == "username"
+
+    def test_falls_back_to_message_without_diag(self):
+        orig = Exception('duplicate key value violates unique constraint "uq_app_user_tenant_email"')
+        assert user_conflict(_integrity_error(orig))[0] == "email"
+
+    def test_other_violations_are_not_conflicts(self):
+        orig = Exception('insert or update on table "app_user" violates foreign key constraint "app_user_tenant_id_fkey"')
+        assert user_conflict(_integrity_error(orig)) is None
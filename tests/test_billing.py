@@ -0,0 +1,352 @@
+"""
+Billing endpoint tests.
+
+Endpoints are called directly against the in-memory SQLite session from
+conftest, with permission checks stubbed out.
+"""
+import uuid
+import pytest
+from fastapi import HTTPException
+from fastapi.dependencies.utils import request_params_to_args
+from starlette.datastructures import QueryParams
+from sqlmodel import Session, select
+
+from app.api.v1 import billing
+from app.api.v1.auth import AuthContext
+from app.models.billing import Invoice, InvoiceItem, Payment
+from app.models.enums import PaymentStatus
+from app.models.laboratory import Order
+from app.models.tenant import Tenant, Branch
+from app.models.user import AppUser
+from app.schemas.billing import InvoiceCreate, InvoiceItemCreate, InvoiceItemUpdate, PaymentCreate
+
+
+@pytest.fixture(autouse=True)
+def allow_all(monkeypatch):
+    """Grant every billing permission."""
+    monkeypatch.setattr(billing, "has_permission", lambda *args: True)
+
+
+@pytest.fixture(name="tenant")
+def tenant_fixture(db_session: Session) -> Tenant:
+    tenant = Tenant(name="Lab")
+    db_session.add(tenant)
+    db_session.commit()
+    return tenant
+
+
+@pytest.fixture(name="branch")
+def branch_fixture(db_session: Session, tenant: Tenant) -> Branch:
+    return _branch(db_session, tenant, "MAIN")
+
+
+@pytest.fixture(name="user")
+def user_fixture(db_session: Session, tenant: Tenant) -> AppUser:
+    user = AppUser(
+        tenant_id=tenant.id,
+        email="billing@example.com",
+        username="billing",
+        full_name="Billing User",
+        first_name="Billing",
+        last_name="User",
+        hashed_password="x",
+    )
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+@pytest.fixture(name="ctx")
+def ctx_fixture(user: AppUser) -> AuthContext:
+    return AuthContext(user_id=str(user.id), tenant_id=str(user.tenant_id))
+
+
+def _branch(session: Session, tenant: Tenant, code: str) -> Branch:
+    branch = Branch(tenant_id=tenant.id, code=code, name=code)
+    session.add(branch)
+    session.commit()
+    return branch
+
+
+def _order(session: Session, branch: Branch) -> Order:
+    order = Order(
+        tenant_id=branch.tenant_id,
+        branch_id=branch.id,
+        patient_id=uuid.uuid4(),
+        order_code=f"ORD-{uuid.uuid4().hex[:8]}",
+    )
+    session.add(order)
+    session.commit()
+    return order
+
+
+def _create_invoice(session, ctx, user, branch, number="INV-1", total=100.0):
+    data = InvoiceCreate(
+        tenant_id=str(branch.tenant_id),
+        branch_id=str(branch.id),
+        order_id=str(_order(session, branch).id),
+        invoice_number=number,
+        subtotal=total,
+        total=total,
+    )
+    return billing.create_invoice(data, session=session, ctx=ctx, user=user)
+
+
+def _pay(session, ctx, user, invoice_id, amount):
+    data = PaymentCreate(tenant_id=ctx.tenant_id, invoice_id=invoice_id, amount=amount)
+    return billing.create_payment(data, session=session, ctx=ctx, user=user)
+
+
+class TestInvoiceNumberUniqueness:
+    """Verify uq_invoice_branch_number surfaces as a 400"""
+
+    def test_duplicate_number_in_branch_is_rejected(self, db_session, ctx, user, branch):
+        _create_invoice(db_session, ctx, user, branch, number="INV-7")
+
+        with pytest.raises(HTTPException) as exc:
+            _create_invoice(db_session, ctx, user, branch, number="INV-7")
+        assert exc.value.status_code == 400
+        assert exc.value.detail == "Invoice number already exists for this branch"
+
+    def test_same_number_in_another_branch_is_allowed(self, db_session, ctx, user, tenant, branch):
+        other = _branch(db_session, tenant, "NORTH")
+        _create_invoice(db_session, ctx, user, branch, number="INV-7")
+
+        response = _create_invoice(db_session, ctx, user, other, number="INV-7")
+        assert response.invoice_number == "INV-7"
+        assert response.branch_id == str(other.id)
+
+
+def _totals(session: Session, invoice_id) -> tuple:
+    invoice = session.get(Invoice, invoice_id)
+    return float(invoice.subtotal), float(invoice.total), float(invoice.amount_total)
+
+
+class TestInvoiceTotals:
+    """Verify recalculate_invoice_totals sums item subtotals in SQL"""
+
+    def test_totals_follow_added_and_updated_items(self, db_session, ctx, user, branch):
+        invoice = _create_invoice(db_session, ctx, user, branch, total=0.0)
+        first = billing.add_invoice_item(
+            invoice.id, InvoiceItemCreate(description="Biopsia", quantity=2, unit_price=50.0),
+            session=db_session, ctx=ctx, user=user,
+        )
+        billing.add_invoice_item(
+            invoice.id, InvoiceItemCreate(description="Tinción", unit_price=30.0),
+            session=db_session, ctx=ctx, user=user,
+        )
+        assert _totals(db_session, invoice.id) == (130.0, 130.0, 130.0)
+
+        billing.update_invoice_item(
+            invoice.id, first.id, InvoiceItemUpdate(quantity=3),
+            session=db_session, ctx=ctx, user=user,
+        )
+        assert _totals(db_session, invoice.id) == (180.0, 180.0, 180.0)
+
+    def test_totals_after_deleting_items(self, db_session, ctx, user, branch):
+        invoice = _create_invoice(db_session, ctx, user, branch, total=0.0)
+        for price in (40.0, 25.0):
+            billing.add_invoice_item(
+                invoice.id, InvoiceItemCreate(description="Item", unit_price=price),
+                session=db_session, ctx=ctx, user=user,
+            )
+        items = db_session.exec(select(InvoiceItem).order_by(InvoiceItem.unit_price)).all()
+
+        db_session.delete(items[0])
+        db_session.flush()
+        billing.recalculate_invoice_totals(db_session, db_session.get(Invoice, invoice.id))
+        db_session.commit()
+        assert _totals(db_session, invoice.id) == (40.0, 40.0, 40.0)
+
+        db_session.delete(items[1])
+        db_session.flush()
+        billing.recalculate_invoice_totals(db_session, db_session.get(Invoice, invoice.id))
+        db_session.commit()
+        assert _totals(db_session, invoice.id) == (0.0, 0.0, 0.0)
+
+    def test_invoice_without_items_totals_zero(self, db_session, ctx, user, branch):
+        invoice = _create_invoice(db_session, ctx, user, branch, total=100.0)
+        stored = db_session.get(Invoice, invoice.id)
+
+        billing.recalculate_invoice_totals(db_session, stored)
+        # SUM over no rows is NULL; COALESCE must turn it into 0, not None
+        assert stored.subtotal == 0
+        assert (stored.total, stored.amount_total) == (0, 0)
+        db_session.commit()
+        assert _totals(db_session, invoice.id) == (0.0, 0.0, 0.0)
+
+
+class TestPaymentBookkeeping:
+    """Verify the amount_paid cache drives invoice status and the order lock"""
+
+    def test_partial_then_full_payment(self, db_session, ctx, user, branch):
+        invoice = _create_invoice(db_session, ctx, user, branch, total=100.0)
+        assert db_session.get(Order, invoice.order_id).billed_lock is True
+
+        _pay(db_session, ctx, user, invoice.id, 40.0)
+        stored = db_session.get(Invoice, invoice.id)
+        assert float(stored.amount_paid) == 40.0
+        assert stored.status == PaymentStatus.PARTIAL
+        assert stored.paid_at is None
+        assert db_session.get(Order, invoice.order_id).billed_lock is True
+
+        _pay(db_session, ctx, user, invoice.id, 60.0)
+        stored = db_session.get(Invoice, invoice.id)
+        assert float(stored.amount_paid) == 100.0
+        assert stored.status == PaymentStatus.PAID
+        assert stored.paid_at is not None
+        assert db_session.get(Order, invoice.order_id).billed_lock is False
+
+    def test_unpaid_invoice_stays_pending(self, db_session, ctx, user, branch):
+        invoice = _create_invoice(db_session, ctx, user, branch, total=100.0)
+        stored = db_session.get(Invoice, invoice.id)
+        assert float(stored.amount_paid) == 0.0
+        assert stored.status == PaymentStatus.PENDING
+
+    def test_order_balance_matches_payment_rows(self, db_session, ctx, user, branch):
+        invoice = _create_invoice(db_session, ctx, user, branch, total=100.0)
+        for amount in (25.5, 30.0):
+            _pay(db_session, ctx, user, invoice.id, amount)
+
+        paid = sum(float(p.amount) for p in db_session.exec(select(Payment)).all())
+        balance = billing.get_order_balance(invoice.order_id, session=db_session, ctx=ctx, user=user)
+        assert balance["total_invoiced"] == 100.0
+        assert balance["total_paid"] == paid == 55.5
+        assert balance["balance"] == 44.5
+        assert balance["is_locked"] is True
+        assert balance["invoices"][0]["balance"] == 44.5
+
+
+class TestZeroAmountPayment:
+    """Verify a zero payment is recorded without touching balances"""
+
+    def test_zero_payment_leaves_invoice_and_order_unchanged(self, db_session, ctx, user, branch):
+        invoice = _create_invoice(db_session, ctx, user, branch, total=100.0)
+        _pay(db_session, ctx, user, invoice.id, 40.0)
+        updated_at = db_session.get(Invoice, invoice.id).updated_at
+
+        response = _pay(db_session, ctx, user, invoice.id, 0.0)
+        assert db_session.get(Payment, response.id) is not None
+        stored = db_session.get(Invoice, invoice.id)
+        # update_invoice_status was skipped, so the row was not rewritten
+        assert stored.updated_at == updated_at
+        assert float(stored.amount_paid) == 40.0
+        assert stored.status == PaymentStatus.PARTIAL
+        assert db_session.get(Order, invoice.order_id).billed_lock is True
+
+    def test_nonzero_payment_updates_invoice_and_order(self, db_session, ctx, user, branch):
+        invoice = _create_invoice(db_session, ctx, user, branch, total=100.0)
+        _pay(db_session, ctx, user, invoice.id, 0.0)
+
+        _pay(db_session, ctx, user, invoice.id, 100.0)
+        stored = db_session.get(Invoice, invoice.id)
+        assert float(stored.amount_paid) == 100.0
+        assert stored.status == PaymentStatus.PAID
+        assert db_session.get(Order, invoice.order_id).billed_lock is False
+        assert len(db_session.exec(select(Payment)).all()) == 2
+
+
+class TestReadEndpoints:
+    """Verify the read endpoints serialize their rows under raiseload("*")"""
+
+    @pytest.fixture(name="invoice")
+    def invoice_fixture(self, db_session, ctx, user, branch):
+        invoice = _create_invoice(db_session, ctx, user, branch, total=0.0)
+        billing.add_invoice_item(
+            invoice.id, InvoiceItemCreate(description="Biopsia", quantity=2, unit_price=50.0),
+            session=db_session, ctx=ctx, user=user,
+        )
+        _pay(db_session, ctx, user, invoice.id, 40.0)
+        # Drop the billing rows from the identity map so each endpoint loads them with raiseload
+        for row in [row for row in db_session if isinstance(row, (Invoice, InvoiceItem, Payment))]:
+            db_session.expunge(row)
+        return invoice
+
+    def test_get_invoice(self, db_session, ctx, user, invoice):
+        response = billing.get_invoice(invoice.id, session=db_session, ctx=ctx, user=user)
+        assert response.id == invoice.id
+        assert (response.total, response.amount_paid) == (100.0, 40.0)
+        assert response.status == PaymentStatus.PARTIAL
+
+    def test_get_invoice_with_items(self, db_session, ctx, user, invoice):
+        response = billing.get_invoice_with_items(invoice.id, session=db_session, ctx=ctx, user=user)
+        assert response.id == invoice.id
+        assert [(i.description, i.quantity, i.subtotal) for i in response.items] == [("Biopsia", 2, 100.0)]
+        assert [p.amount for p in response.payments] == [40.0]
+        assert response.balance == 60.0
+
+    def test_get_order_balance(self, db_session, ctx, user, invoice):
+        response = billing.get_order_balance(invoice.order_id, session=db_session, ctx=ctx, user=user)
+        assert (response["total_invoiced"], response["total_paid"], response["balance"]) == (100.0, 40.0, 60.0)
+        assert [i["id"] for i in response["invoices"]] == [invoice.id]
+
+    def test_get_order_invoice(self, db_session, ctx, user, invoice):
+        response = billing.get_order_invoice(invoice.order_id, session=db_session, ctx=ctx, user=user)
+        assert response.id == invoice.id
+        assert response.order_id == invoice.order_id
+        assert [i.subtotal for i in response.items] == [100.0]
+        assert [p.amount for p in response.payments] == [40.0]
+        assert response.balance == 60.0
+
+
+def _invoice_row(session: Session, branch: Branch) -> Invoice:
+    invoice = Invoice(
+        tenant_id=branch.tenant_id,
+        branch_id=branch.id,
+        order_id=uuid.uuid4(),
+        invoice_number=f"INV-{uuid.uuid4().hex[:8]}",
+        subtotal=10,
+        total=10,
+        amount_total=10,
+    )
+    session.add(invoice)
+    session.add(Payment(tenant_id=branch.tenant_id, invoice_id=invoice.id, amount=10))
+    session.commit()
+    return invoice
+
+
+def _parse_query(path: str, query: str):
+    """Validate query parameters the way FastAPI does; any error becomes a 422."""
+    route = next(r for r in billing.router.routes if r.path == path and "GET" in r.methods)
+    return request_params_to_args(route.dependant.query_params, QueryParams(query))
+
+
+@pytest.mark.parametrize("list_endpoint", [billing.list_invoices, billing.list_payments])
+class TestListingPagination:
+    """Verify keyset pages and tenant scoping of the invoice and payment listings"""
+
+    def test_pages_follow_the_after_cursor(self, db_session, ctx, user, branch, list_endpoint):
+        for _ in range(5):
+            _invoice_row(db_session, branch)
+        everything = list_endpoint(session=db_session, ctx=ctx, user=user, limit=500, after=None)
+        ids = [row["id"] for row in everything]
+        assert len(ids) == 5 and ids == sorted(ids)
+
+        pages, after = [], None
+        while True:
+            page = list_endpoint(session=db_session, ctx=ctx, user=user, limit=2, after=after)
+            pages.append([row["id"] for row in page])
+            if len(page) < 2:
+                break
+            after = uuid.UUID(page[-1]["id"])
+        assert pages == [ids[0:2], ids[2:4], ids[4:5]]
+
+    def test_other_tenants_are_hidden(self, db_session, ctx, user, branch, list_endpoint):
+        mine = _invoice_row(db_session, branch)
+        other_tenant = Tenant(name="Other lab")
+        db_session.add(other_tenant)
+        db_session.commit()
+        _invoice_row(db_session, _branch(db_session, other_tenant, "MAIN"))
+
+        rows = list_endpoint(session=db_session, ctx=ctx, user=user, limit=100, after=None)
+        assert len(rows) == 1
+        assert rows[0]["tenant_id"] == str(mine.tenant_id)
+
+
+@pytest.mark.parametrize("path", ["/billing/invoices/", "/billing/payments/"])
+def test_listing_limit_is_capped(path):
+    assert _parse_query(path, "")[0]["limit"] == 100
+    assert _parse_query(path, "limit=500")[1] == []
+    assert _parse_query(path, "limit=0")[1][0]["type"] == "greater_than_equal"
+    errors = _parse_query(path, "limit=501")[1]
+    assert [(e["loc"], e["type"]) for e in errors] == [(("query", "limit"), "less_than_equal")]
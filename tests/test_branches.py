@@ -0,0 +1,173 @@
+"""
+Branch endpoint tests.
+
+Endpoints are called directly against the in-memory SQLite session from
+conftest, with permission checks stubbed out.
+"""
+import uuid
+import pytest
+from fastapi.dependencies.utils import request_params_to_args
+from starlette.datastructures import QueryParams
+from sqlmodel import Session
+
+from app.api.v1 import branches
+from app.api.v1.auth import AuthContext
+from app.core.rbac import get_roles_for_users
+from app.models.role import Role
+from app.models.tenant import Tenant, Branch
+from app.models.user import AppUser, UserBranch
+from app.models.user_role import UserRoleLink
+
+
+@pytest.fixture(autouse=True)
+def allow_all(monkeypatch):
+    """Grant every permission checked by the branch endpoints."""
+    monkeypatch.setattr(branches, "has_permission", lambda *args: True)
+
+
+@pytest.fixture(name="roles")
+def roles_fixture(db_session: Session) -> dict:
+    roles = {code: Role(id=uuid.uuid4(), code=code, name=code, is_system=True) for code in ("admin", "superuser", "viewer")}
+    db_session.add_all(roles.values())
+    db_session.commit()
+    return roles
+
+
+def _tenant(session: Session, name: str) -> Tenant:
+    tenant = Tenant(name=name)
+    session.add(tenant)
+    session.commit()
+    return tenant
+
+
+def _user(session: Session, tenant: Tenant, name: str, roles=(), branch: Branch = None) -> AppUser:
+    user = AppUser(
+        tenant_id=tenant.id,
+        email=f"{name}@example.com",
+        username=name,
+        full_name=name,
+        first_name=name,
+        last_name="",
+        hashed_password="x",
+    )
+    session.add(user)
+    session.add_all(UserRoleLink(user_id=user.id, role_id=role.id) for role in roles)
+    if branch is not None:
+        session.add(UserBranch(user_id=user.id, branch_id=branch.id))
+    session.commit()
+    return user
+
+
+def _parse_query(path: str, query: str):
+    """Validate query parameters the way FastAPI does; any error becomes a 422."""
+    route = next(r for r in branches.router.routes if r.path == path and "GET" in r.methods)
+    return request_params_to_args(route.dependant.query_params, QueryParams(query))
+
+
+class TestListBranches:
+    """Verify keyset pages, tenant scoping and the page size cap of the branch listing"""
+
+    @pytest.fixture(name="tenant")
+    def tenant_fixture(self, db_session):
+        tenant = _tenant(db_session, "Lab")
+        db_session.add_all(Branch(tenant_id=tenant.id, code=f"B{n}", name=f"Branch {n}") for n in range(5))
+        db_session.commit()
+        return tenant
+
+    @pytest.fixture(name="list_page")
+    def list_page_fixture(self, db_session, tenant):
+        user = _user(db_session, tenant, "viewer")
+        ctx = AuthContext(user_id=str(user.id), tenant_id=str(tenant.id))
+        return lambda limit, after=None: branches.list_branches(session=db_session, ctx=ctx, user=user, limit=limit, after=after)
+
+    def test_pages_follow_the_after_cursor(self, list_page):
+        ids = [row["id"] for row in list_page(500)]
+        assert len(ids) == 5 and ids == sorted(ids)
+
+        pages, after = [], None
+        while True:
+            page = list_page(2, after)
+            pages.append([row["id"] for row in page])
+            if len(page) < 2:
+                break
+            after = uuid.UUID(page[-1]["id"])
+        assert pages == [ids[0:2], ids[2:4], ids[4:5]]
+
+    def test_other_tenants_are_hidden(self, db_session, tenant, list_page):
+        other = _tenant(db_session, "Other lab")
+        db_session.add(Branch(tenant_id=other.id, code="B0", name="Foreign"))
+        db_session.commit()
+
+        rows = list_page(100)
+        assert len(rows) == 5
+        assert {row["tenant_id"] for row in rows} == {str(tenant.id)}
+
+    def test_limit_is_capped(self):
+        assert _parse_query("/branches/", "")[0]["limit"] == 100
+        assert _parse_query("/branches/", "limit=500")[1] == []
+        assert _parse_query("/branches/", "limit=0")[1][0]["type"] == "greater_than_equal"
+        errors = _parse_query("/branches/", "limit=501")[1]
+        assert [(e["loc"], e["type"]) for e in errors] == [(("query", "limit"), "less_than_equal")]
+
+
+class TestListBranchUsers:
+    """Verify explicit members plus the tenant's full-access users, each once"""
+
+    @pytest.fixture(name="listing")
+    def listing_fixture(self, db_session, roles):
+        tenant = _tenant(db_session, "Lab")
+        branch = Branch(tenant_id=tenant.id, code="MAIN", name="Main")
+        db_session.add(branch)
+        db_session.commit()
+
+        viewer = _user(db_session, tenant, "viewer", [roles["viewer"]], branch)
+        member_admin = _user(db_session, tenant, "member_admin", [roles["admin"]], branch)
+        no_roles = _user(db_session, tenant, "no_roles", [], branch)
+        implicit = _user(db_session, tenant, "implicit", [roles["admin"], roles["superuser"]])
+        _user(db_session, tenant, "elsewhere", [roles["viewer"]])
+        _user(db_session, _tenant(db_session, "Other lab"), "foreign_admin", [roles["admin"]])
+
+        ctx = AuthContext(user_id=str(viewer.id), tenant_id=str(tenant.id))
+        rows = branches.list_branch_users(str(branch.id), session=db_session, ctx=ctx, user=viewer)
+        expected = {
+            "viewer": str(viewer.id),
+            "member_admin": str(member_admin.id),
+            "no_roles": str(no_roles.id),
+            "implicit": str(implicit.id),
+        }
+        return rows, expected
+
+    def test_members_and_tenant_full_access_users(self, listing):
+        rows, expected = listing
+        assert {row["full_name"]: row["id"] for row in rows} == expected
+
+    def test_users_are_not_duplicated(self, listing):
+        rows, _ = listing
+        ids = [row["id"] for row in rows]
+        assert len(ids) == len(set(ids))
+
+    def test_roles_per_user(self, listing):
+        rows, _ = listing
+        roles = {row["full_name"]: sorted(row["roles"]) for row in rows}
+        assert roles == {
+            "viewer": ["viewer"],
+            "member_admin": ["admin"],
+            "no_roles": [],
+            "implicit": ["admin", "superuser"],
+        }
+
+
+class TestGetRolesForUsers:
+    """Verify the batched role lookup"""
+
+    def test_every_requested_user_has_an_entry(self, db_session, roles):
+        tenant = _tenant(db_session, "Lab")
+        admin = _user(db_session, tenant, "admin", [roles["admin"], roles["viewer"]])
+        no_roles = _user(db_session, tenant, "no_roles")
+
+        result = get_roles_for_users([admin.id, no_roles.id], db_session)
+        assert sorted(result[admin.id]) == ["admin", "viewer"]
+        assert result[no_roles.id] == []
+
+    def test_no_users_returns_empty_mapping(self, db_session):
+        assert get_roles_for_users([], db_session) == {}
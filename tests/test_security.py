@@ -1,7 +1,13 @@
 """
 Unit tests for Celuma API security functions
 """
-from app.core.security import verify_password, hash_password
+import time
+
+import jwt
+
+from app.core import security
+from app.core.config import settings
+from app.core.security import verify_password, hash_password, dummy_verify_password, create_jwt, decode_jwt
 
 class TestPasswordSecurity:
     """Test password hashing and verification"""
@@ -40,6 +46,11 @@ class TestPasswordSecurity:
         long_hashed = hash_password(long_password)
         assert verify_password(long_password, long_hashed) is True
 
+    def test_dummy_verification_never_succeeds(self):
+        """The unknown-user verification path must always fail"""
+        assert dummy_verify_password("testpassword123") is False
+        assert dummy_verify_password("") is False
+
 class TestSecurityEdgeCases:
     """Test security edge cases and error handling"""
     
@@ -60,3 +71,45 @@ class TestSecurityEdgeCases:
         long_hash = hash_password(long_password)
         assert isinstance(long_hash, str)
         assert verify_password(long_password, long_hash) is True
+
+
+class TestJwtDecodeCache:
+    """Test caching of verified JWT payloads"""
+
+    def setup_method(self):
+        security._verified_jwts.clear()
+
+    def test_decode_returns_payload_and_caches_it(self):
+        """A valid token is verified once and then served from the cache"""
+        token = create_jwt(sub="user-1")
+        assert decode_jwt(token)["sub"] == "user-1"
+        assert security.hash_token(token) in security._verified_jwts
+        assert decode_jwt(token)["sub"] == "user-1"
+
+    def test_cached_payload_is_a_copy(self):
+        """Mutating a returned payload must not leak into later calls"""
+        token = create_jwt(sub="user-1")
+        decode_jwt(token)["sub"] = "someone-else"
+        assert decode_jwt(token)["sub"] == "user-1"
+
+    def test_tampered_token_is_rejected(self):
+        """A token with a modified signature is never cached"""
+        token = create_jwt(sub="user-1")
+        tampered = token[:-2] + ("AA" if not token.endswith("AA") else "BB")
+        assert decode_jwt(tampered) is None
+        assert security.hash_token(tampered) not in security._verified_jwts
+
+    def test_token_without_required_claims_is_rejected(self):
+        """Tokens missing sub or exp never decode, even with a valid signature"""
+        no_exp = jwt.encode({"sub": "user-1"}, settings.jwt_secret, algorithm="HS256")
+        no_sub = jwt.encode({"exp": time.time() + 60}, settings.jwt_secret, algorithm="HS256")
+        assert decode_jwt(no_exp) is None
+        assert decode_jwt(no_sub) is None
+
+    def test_expired_cache_entry_is_dropped(self):
+        """A cached payload stops being returned once its exp has passed"""
+        token = create_jwt(sub="user-1")
+        key = security.hash_token(token)
+        security._verified_jwts[key] = ({"sub": "user-1", "exp": 0}, 0)
+        assert decode_jwt(token)["sub"] == "user-1"
+        assert security._verified_jwts[key][1] > 0
@@ -0,0 +1,101 @@
+"""
+Unit tests for the in-process JWT blacklist cache.
+
+Uses the in-memory SQLite db_session from conftest so the cache-miss path
+runs a real query.
+"""
+import time
+import uuid
+import pytest
+from sqlmodel import Session, select
+from datetime import datetime
+
+from app.models.user import BlacklistedToken
+from app.core import token_blacklist
+from app.core.security import hash_token
+from app.core.token_blacklist import is_token_revoked, mark_token_revoked
+
+
+@pytest.fixture(name="session")
+def session_fixture(db_session: Session):
+    """The shared SQLite session, with an empty cache around each test."""
+    token_blacklist.clear_cache()
+    yield db_session
+    token_blacklist.clear_cache()
+
+
+def _blacklist(session: Session, token: str, exp: float) -> None:
+    session.add(BlacklistedToken(
+        token_hash=hash_token(token),
+        user_id=uuid.uuid4(),
+        expires_at=datetime.utcfromtimestamp(exp),
+    ))
+    session.commit()
+
+
+class TestTokenBlacklistCache:
+    """Verify cache hits, misses and invalidation"""
+
+    def test_unknown_token_is_not_revoked(self, session: Session):
+        assert is_token_revoked(session, "live-token", time.time() + 600) is False
+
+    def test_blacklisted_token_is_revoked(self, session: Session):
+        exp = time.time() + 600
+        _blacklist(session, "revoked-token", exp)
+        assert is_token_revoked(session, "revoked-token", exp) is True
+
+    def test_revoked_answer_is_served_from_cache(self, session: Session):
+        exp = time.time() + 600
+        _blacklist(session, "revoked-token", exp)
+        assert is_token_revoked(session, "revoked-token", exp) is True
+
+        session.exec(BlacklistedToken.__table__.delete())
+        session.commit()
+        assert is_token_revoked(session, "revoked-token", exp) is True
+
+    def test_mark_token_revoked_overrides_cached_miss(self, session: Session):
+        exp = time.time() + 600
+        assert is_token_revoked(session, "token", exp) is False
+        mark_token_revoked("token", exp)
+        assert is_token_revoked(session, "token", exp) is True
+
+    def test_not_revoked_answer_expires(self, session: Session, monkeypatch):
+        exp = time.time() + 600
+        monkeypatch.setattr(token_blacklist, "NOT_REVOKED_TTL_SECONDS", 0)
+        assert is_token_revoked(session, "token", exp) is False
+
+        _blacklist(session, "token", exp)
+        assert is_token_revoked(session, "token", exp) is True
+
+
+class TestExpiredTokenCleanup:
+    """Verify batched removal of expired blacklist rows"""
+
+    def test_cleanup_removes_only_expired_tokens(self, session: Session):
+        from app.core.cleanup import cleanup_expired_tokens
+
+        now = time.time()
+        for i in range(7):
+            _blacklist(session, f"expired-{i}", now - 60)
+        _blacklist(session, "live", now + 600)
+
+        assert cleanup_expired_tokens(session, batch_size=3) == 7
+        remaining = session.exec(select(BlacklistedToken.token_hash)).all()
+        assert remaining == [hash_token("live")]
+
+    def test_lifespan_waits_for_cancelled_cleanup_task(self, monkeypatch):
+        import asyncio
+        from app import main
+
+        async def cleanup_forever(interval_seconds):
+            await asyncio.Event().wait()
+
+        monkeypatch.setattr(main, "run_periodic_token_cleanup", cleanup_forever)
+        monkeypatch.setattr(main.settings, "token_cleanup_interval_min", 1)
+
+        async def start_and_stop():
+            async with main.lifespan(main.app):
+                await asyncio.sleep(0)
+            return asyncio.all_tasks() - {asyncio.current_task()}
+
+        assert asyncio.run(start_and_stop()) == set()